@@ -1,39 +1,112 @@
-from flask import Flask, flash, request, redirect, url_for, render_template, session
-from hashlib import sha256
-from models import db, User, Quest, Pet
+from flask import Flask, flash, request, redirect, url_for, render_template, session, jsonify, Response, stream_with_context
+from flask_migrate import Migrate
+from models import db, User, Quest, Pet, QuestTemplate, QuestCompletion, mark_user_changed
 from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+import os
 import re
 from datetime import datetime, timedelta
 import pytz
 from loadquests import load_presets
+from rollover import rollover_user_quests
+from scheduler import RolloverScheduler
+from streaks import streak_score_mismatches, repair_streak_scores
+from maintenance import run_maintenance
+from homestate import load_home_state, load_snapshot
+from catalog import QuestCatalog
+from passwords import PasswordHasher, PasswordHasherBusy
+from interactions import InteractionBuffer
+from statecache import StateCache
+from liveupdates import LiveUpdates
+from questbatch import new_quest, run_batch, MAX_OPERATIONS
+from database import init_database
+from metrics import RequestMetrics
+from querybudget import query_budget
+from assets import init_assets, build_assets
+from history import (completed_quests_query, daily_completions_query, task_json, parse_time, encode_cursor, decode_cursor,
+                     DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_STATS_DAYS, MAX_STATS_DAYS)
 import random
+import click
+import json
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'
+# password KDF and its cost (iterations for pbkdf2_sha256, n for scrypt), see passwords.py
+app.config['PASSWORD_HASH_SCHEME'] = os.environ.get('PASSWORD_HASH_SCHEME', 'pbkdf2_sha256')
+app.config['PASSWORD_HASH_COST'] = int(os.environ.get('PASSWORD_HASH_COST', 0)) or None
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+# share of requests profiled for /metrics (0 turns it off) and when to log one as slow, see metrics.py
+app.config['METRICS_SAMPLE_RATE'] = float(os.environ.get('METRICS_SAMPLE_RATE', 1))
+app.config['METRICS_SLOW_REQUEST_MS'] = float(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+# serve /metrics at all (off by default), and the bearer token scrapes must send, see metrics.py
+app.config['METRICS_ENDPOINT'] = os.environ.get('METRICS_ENDPOINT') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# fail any view that runs more SQL than its @query_budget, for development, see querybudget.py
+app.config['ENFORCE_QUERY_BUDGETS'] = os.environ.get('ENFORCE_QUERY_BUDGETS') == '1'
+# per-user state cache: 'memory' (per worker) or 'sqlite' (shared by the workers on a host), see statecache.py
+app.config['STATE_CACHE_BACKEND'] = os.environ.get('STATE_CACHE_BACKEND', 'memory')
+app.config['STATE_CACHE_SIZE'] = int(os.environ.get('STATE_CACHE_SIZE', 1000))
+app.config['STATE_CACHE_TTL'] = float(os.environ.get('STATE_CACHE_TTL', 30))
+app.config['STATE_CACHE_PATH'] = os.environ.get('STATE_CACHE_PATH')
+# how /api/events streams hear about changes: 'memory' (one worker) or 'sqlite' (all workers on a host), see liveupdates.py
+app.config['LIVE_UPDATES_BROKER'] = os.environ.get('LIVE_UPDATES_BROKER', 'memory')
+app.config['LIVE_UPDATES_PATH'] = os.environ.get('LIVE_UPDATES_PATH')
+app.config['LIVE_UPDATES_HEARTBEAT'] = float(os.environ.get('LIVE_UPDATES_HEARTBEAT', 15))
 email_pattern = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
 
-db.init_app(app)
+# database URL, SQLite pragmas and pool sizes all come from the environment, see database.py
+init_database(app, os.environ)
+password_hasher = PasswordHasher.from_config(app.config)
+request_metrics = RequestMetrics(app)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
 
+# preset quests for onboarding, cached in memory
+quest_catalog = QuestCatalog()
+
+# hashed static files and the asset_url() template helper, see assets.py
+init_assets(app)
+
+# quests roll over in the background, started lazily so each worker gets its own thread
+rollover_scheduler = RolloverScheduler(app)
+app.before_request(rollover_scheduler.ensure_started)
+
+# snapshots of each user's pet and quests, dropped whenever a commit changes them
+state_cache = StateCache(app, load_snapshot)
+request_metrics.add_collector(state_cache.metrics)
+
+# play/feed clicks are tallied in memory and written in batches, see interactions.py
+interaction_buffer = InteractionBuffer(app, state_cache)
+app.before_request(interaction_buffer.ensure_started)
+request_metrics.add_collector(interaction_buffer.metrics)
+
+# pushes pet, food and quest changes to open pages over SSE, see liveupdates.py
+live_updates = LiveUpdates(app, state_cache, interaction_buffer)
+request_metrics.add_collector(live_updates.metrics)
 
 
 ######################################
 ########## Main User Pages ###########
 ######################################
 
-# global bool to check for first login
-firstLogin = False
-
 @app.route('/')
+@query_budget(0)
 def welcome():
     # This route renders the main homepage, which is index.html
     return render_template('index.html')
 
 @app.route('/create', methods=['GET', 'POST'])
+@query_budget(3)
 def create():
-    global firstLogin
+    # Fetch user_id from session
+    user_id = session.get('user_id')
+
+    if not user_id:
+        flash("User session not found, please login again.", 'error')
+        return redirect(url_for('login'))
 
-    if not firstLogin:
+    # onboarding progress is kept per user, so any worker can serve any step
+    user = db.session.get(User, user_id)
+    if not user or user.onboarding_stage != 'pet':
         return redirect(url_for('home'))
 
     if request.method == 'GET':
@@ -43,17 +116,16 @@ def create():
     petName = request.form.get('petName')
     petType = request.form.get('petSelection')
 
-    # Fetch user_id from session
-    user_id = session.get('user_id')
-
-    if not user_id:
-        flash("User session not found, please login again.", 'error')
-        return redirect(url_for('login'))
-
-    # Save pet information to the database
+    # Save pet information to the database, and move on to picking quests in the same commit
     new_pet = Pet(user_id=user_id, pet_type=petType, name=petName)
     db.session.add(new_pet)
-    db.session.commit()
+    user.onboarding_stage = 'quests'
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # a second submit lost the race to uq_pet_user_id, the first one already made the pet
+        db.session.rollback()
+        return redirect(url_for('newquests'))
 
     # Save pet info in session for immediate use
     session['pet_name'] = petName
@@ -64,48 +136,38 @@ def create():
 
 
 @app.route('/create_quests', methods=['GET', 'POST'])
+@query_budget(4)  # one more when the template catalog has to load
 def newquests():
-    global firstLogin
-
-    if not firstLogin:
-        return redirect(url_for('home'))
-
-    if request.method == 'GET':
-        return render_template('newquests.html')
-    
     user_id = session.get('user_id')
 
     if not user_id:
         flash("User session not found, please login again.", 'error')
         return redirect(url_for('login'))
-    
 
-    fake_user = User.query.filter_by(username="fake_user").first()
-    fake_quests = Quest.query.filter_by(assigned_to=fake_user.id).all()
-
-    selections = request.form.get("clickedButtons")
-    for quest in fake_quests:
-        if quest.description in selections:
-            copied_quest = Quest(
-            description=quest.description,
-            user_id=user_id,
-            quest_type=quest.quest_type,
-            weight=quest.reward,
-            due_date=datetime.now(tz=pytz.utc) + timedelta(days=1),
-            repeat_days=quest.repeat_days,
-            end_of_day=quest.end_of_day,
-            repeat=quest.repeat)
-            copied_quest.save()
-    db.session.commit()   
-
-    firstLogin = False
+    user = db.session.get(User, user_id)
+    if not user or user.onboarding_stage != 'quests':
+        return redirect(url_for('home'))
+
+    if request.method == 'GET':
+        return render_template('newquests.html', quest_templates=quest_catalog.templates())
+
+    # the page posts the ids of the templates that were picked, as a JSON list
+    try:
+        template_ids = [int(template_id) for template_id in json.loads(request.form.get("template_ids") or "[]")]
+    except (ValueError, TypeError):
+        flash("Invalid quest selection.", 'error')
+        return render_template('newquests.html', quest_templates=quest_catalog.templates())
+
+    # adopted quests are due tomorrow, the scheduler's periodic rebuild picks them up well before then
+    user.onboarding_stage = 'done'
+    quest_catalog.adopt(user_id, list(dict.fromkeys(template_ids)))
+    db.session.commit()  # in case no quests were picked and adopt had nothing to commit
     
     return redirect(url_for('home'))
 
 @app.route('/register', methods=['GET', 'POST'])
+@query_budget(3)
 def register():
-    global firstLogin
-
     if request.method == 'GET':
         return render_template('register.html')
 
@@ -124,9 +186,7 @@ def register():
         flash('Please enter a valid email.', 'error')
         return render_template('register.html')
 
-    if password:
-        password_hash = sha256(password.encode()).hexdigest()
-    else:
+    if not password:
         flash('Password hashing failed.', 'error')
         return render_template('register.html')
 
@@ -138,11 +198,16 @@ def register():
         flash('Email already registered.', 'error')
         return render_template('register.html')
 
+    # hash last, there's no point paying for the KDF on a registration we reject
+    try:
+        password_hash = password_hasher.hash(password)
+    except PasswordHasherBusy:
+        flash('The server is busy, please try again in a moment.', 'error')
+        return render_template('register.html'), 503
+
     new_user = User(username=username, password_hash=password_hash, email=email)
     new_user.save()
 
-    firstLogin = True
-
     # Flash a success message and redirect to login page
     flash('Registration successful! Please login.', 'success')
     return redirect(url_for('login'))
@@ -150,6 +215,7 @@ def register():
 
 
 @app.route('/login', methods=['GET', 'POST'])
+@query_budget(10)  # rollover and a rehash on top of the usual five
 def login():
     """ Authenticates a user with username and password.
 
@@ -181,80 +247,126 @@ def login():
         flash('User does not exist!', 'error')  # Show error if the user does not exist
         return render_template('login.html')
 
-    # Hash the input password to compare with the stored password
-    hashed_password = sha256(password.encode()).hexdigest()
+    # Check the password against the stored hash, on the hashing pool rather than this thread
+    try:
+        password_ok = password_hasher.verify(password, user.password_hash)
+    except PasswordHasherBusy:
+        flash('The server is busy, please try again in a moment.', 'error')
+        return render_template('login.html'), 503
 
-    # Check if the hashed password matches the stored hashed password
-    if user.password_hash != hashed_password:
+    if not password_ok:
         flash('Incorrect username or password!', 'error')  # Show error if the password is incorrect
         return render_template('login.html')
 
+    # old sha256 hashes, or ones made at an older cost, are upgraded now that we know the password
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            new_hash = password_hasher.hash(password)
+            # account_updated is kept as it is, its onupdate would otherwise restart the pet's decay
+            db.session.execute(update(User).where(User.id == user.id)
+                               .values(password_hash=new_hash, account_updated=User.account_updated)
+                               .execution_options(synchronize_session=False))
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass  # still a valid login, we'll upgrade it next time
+
     # Clear any previous session data before setting new session data
     session.clear()
 
-    # happiness and hunger decay
-    user.update_pet_status_on_login()
-    
-    # reset due dates for each quest
-    for quest in user.quests:
-        quest.reset_due_date()
-    db.session.commit()
+    # the scheduler normally gets there first, this just catches anything it hasn't yet
+    rollover_user_quests(user.id)
 
     # Set session data for the logged-in user
     session['user_id'] = user.id
     session['username'] = user.username  # Set the username in session
 
-    db.session.execute(
-        update(User).where(User.id == user.id)
-    )
-
-    if user.pet:
-        session['pet_type'] = user.pet.pet_type
-        session['pet_happiness'] = user.pet.happiness
-        session['pet_hunger'] = user.pet.hunger
+    pet = state_cache.get(user.id)["pet"]
+    if pet:
+        session['pet_type'] = pet["pet_type"]
+        # happiness and hunger decay is worked out on read, nothing to write here
+        state = interaction_buffer.project(pet)
+        session['pet_happiness'], session['pet_hunger'] = state["happiness"], state["hunger"]
 
-    # Redirect to home page after successful login, or pet creation page if first time
-    if (firstLogin):
+    # Redirect to home page after successful login, or wherever they got to in onboarding
+    if user.onboarding_stage == 'pet':
         return redirect(url_for('create'))
+    if user.onboarding_stage == 'quests':
+        return redirect(url_for('newquests'))
     
     return redirect(url_for('home'))
 
 @app.route('/home', methods=['GET'])
+@query_budget(2)
 def home():
+    # This is just the page shell, pet stats and quests are filled in from /api/home_state
     username = session.get('username', 'Guest')
     user_id = session.get('user_id')
 
-    # Initialize the pet variable to None
-    pet = None
-
     # Fetch the user's pet either from session or from the database
     pet_name = session.get('pet_name')
     pet_type = session.get('pet_type')
 
-    pet = Pet.query.filter_by(user_id=user_id).first()
-    if pet:
-        pet_name = pet.name
-        pet_type = pet.pet_type
-        # Update the session with the pet information
-        session['pet_name'] = pet_name
-        session['pet_type'] = pet_type
-
-    user_quests = Quest.query.filter_by(assigned_to=user_id).all()
+    if user_id and not (pet_name and pet_type):
+        snapshot = state_cache.get(user_id)
+        pet = snapshot and snapshot["pet"]
+        if pet:
+            pet_name = pet["name"]
+            pet_type = pet["pet_type"]
+            # Update the session with the pet information
+            session['pet_name'] = pet_name
+            session['pet_type'] = pet_type
 
-    for quest in user_quests:
-        quest.reset_due_date()
-
-    # Render the template with the correct pet values
     return render_template('home.html',
                            username=username,
                            pet_type=pet_type,
-                           pet_name=pet_name,
-                           pet_happiness=pet.happiness if pet else None,
-                           pet_hunger=pet.hunger if pet else None,
-                           user_quests=user_quests)
+                           pet_name=pet_name)
+
+
+@app.route('/api/home_state', methods=['GET'])
+@query_budget(1)
+def home_state():
+    """ API request for everything the home page shows: pet stats, food and active quests.
+
+        Carries an ETag of the state, so a poll that sends it back in
+        If-None-Match gets an empty 304 when nothing has changed.
+
+        Return:
+            JSON -> home state or error
+            Int -> Return Code
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "Unauthorized"}, 401
+
+    state = load_home_state(user_id, state_cache, interaction_buffer)
+    if state is None:
+        return {"error": "User not found!"}, 404
+
+    response = jsonify(state)
+    # always revalidate, the ETag makes that cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route('/api/events', methods=['GET'])
+@query_budget(0)  # the stream reads the state after the view has returned
+def events():
+    """ Server-Sent Events stream of the user's home state: everything once, then only what changes.
+
+        Return:
+            text/event-stream -> state, pet, inventory and quests events, see liveupdates.py
+            Int -> Return Code
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "Unauthorized"}, 401
+
+    return live_updates.stream(user_id)
 
 
 @app.route('/user_quests/')
+@query_budget(1)
 def user_quests():
     username = session.get('username', None)
 
@@ -274,6 +386,7 @@ def user_quests():
     return f"quests for {username}: " #+ ', '.join(quests)
 
 @app.route('/api/feed_pet', methods=['POST'])
+@query_budget(1)
 def feed_pet():
     food_type = request.form.get('type', 'food')  # 'food' or 'special'
 
@@ -282,43 +395,48 @@ def feed_pet():
     if not user_id:
         return {"error": "User session not found!"}, 400
 
-    pet = Pet.query.filter_by(user_id=user_id).first()
-    if not pet:
+    # Update the food quantity, buffered and written with the next batch
+    state = interaction_buffer.feed(user_id, food_type)
+    if not state:
         return {"error": "Pet not found!"}, 404
+    live_updates.publish([user_id])
 
-    # Update the food quantity
-    # use function because it was hard to track down this hardcoding here
-    pet.feed(food_type)
-
-    pet.update()  # Save changes to the database
     return {
         "success": True,
-        "food_quantity": pet.food_quantity,
-        "special_food_quantity": pet.special_food_quantity,
-        "hunger": pet.hunger
+        "food_quantity": state["food_quantity"],
+        "special_food_quantity": state["special_food_quantity"],
+        "hunger": state["hunger"]
     }, 200
 
 @app.route('/api/get_food_quantities', methods=['GET'])
+@query_budget(1)
 def get_food_quantities():
     user_id = session.get('user_id')
     if not user_id:
         return {"error": "Unauthorized"}, 401
 
-    pet = Pet.query.filter_by(user_id=user_id).first()
+    snapshot = state_cache.get(user_id)
+    pet = snapshot and snapshot["pet"]
     if not pet:
         return {"error": "Pet not found!"}, 404
 
+    # include feeds that haven't been written yet
+    state = interaction_buffer.project(pet)
     return {
-        "food_quantity": pet.food_quantity,
-        "special_food_quantity": pet.special_food_quantity
+        "food_quantity": state["food_quantity"],
+        "special_food_quantity": state["special_food_quantity"]
     }, 200
 
 @app.route('/api/update_food_quantities', methods=['POST'])
+@query_budget(3)  # including the buffer flush
 def update_food_quantities():
     user_id = session.get('user_id')
     if not user_id:
         return {"error": "Unauthorized"}, 401
 
+    # these are absolute, so write out any buffered feeds first or they'd be applied on top
+    interaction_buffer.flush()
+
     pet = Pet.query.filter_by(user_id=user_id).first()
     if not pet:
         return {"error": "Pet not found!"}, 404
@@ -337,6 +455,7 @@ def update_food_quantities():
     return {"success": "Food quantities updated successfully!"}, 200
 
 @app.route('/api/play_with_pet', methods=['POST'])
+@query_budget(1)
 def play_with_pet():
     """
     API request to play with the pet.
@@ -352,18 +471,18 @@ def play_with_pet():
         app.logger.error("User not logged in.")
         return {"error": "User not logged in!"}, 401
 
-    # get pet
-    pet = Pet.query.filter_by(user_id=user_id).first()
-    if not pet:
-        app.logger.error(f"Pet for user ID {user_id} not found.")
-        return {"error": "Pet not found!"}, 404
-
     # thought it would be fun to make amount random 1, 2 or 3
     play_amount = random.choice([1, 2, 3])
-    pet.play(play_amount)
 
-    app.logger.info(f"Played with pet (ID: {pet.id}). Increased happiness by {play_amount}.")
-    return {"success": "Played with pet!", "happiness": pet.happiness}, 200
+    # buffered, the pet row is written with the next batch
+    state = interaction_buffer.play(user_id, play_amount)
+    if not state:
+        app.logger.error(f"Pet for user ID {user_id} not found.")
+        return {"error": "Pet not found!"}, 404
+    live_updates.publish([user_id])
+
+    app.logger.info(f"Played with pet (user ID: {user_id}). Increased happiness by {play_amount}.")
+    return {"success": "Played with pet!", "happiness": state["happiness"]}, 200
 
 ######################################
 ###### API and Quest Management ######
@@ -371,6 +490,7 @@ def play_with_pet():
 
 
 @app.route('/api/add_task', methods=['POST'])
+@query_budget(3)
 def add_task():
     """ API request to add a quest for the logged-in user.
         Post:
@@ -381,35 +501,29 @@ def add_task():
             String -> Success/Error
             Int -> Return Code
     """
-    task_description = request.form.get('task_description')
-    task_type = request.form.get('task_type', 'daily') # Not currently included in form, rather calculated as daily if all days are selected
     user_id = session.get('user_id')
-    due_date = request.form.get('due_date')  # 'YYYY-MM-DD'
-    due_time = request.form.get('due_time')  # 'HH:MM'
-    repeat_days = request.form.getlist('repeat_days')  # ['Monday', 'Wednesday']
-    end_of_day = bool(request.form.get('end_of_day'))  # bool
-    timezone = request.form.get('timezone')
-    local_timezone = pytz.timezone(timezone)
-    repeat = True if task_type != 'none' else False
-
-    if not task_description or not task_type or not user_id:
-        return {"error": "Missing field in POST!"}, 400
-
-    # convert format of data and time
-    if due_date:
-        due_date = datetime.strptime(due_date, '%Y-%m-%d').replace(tzinfo=local_timezone)
-    if due_time:
-        due_time = datetime.strptime(due_time, '%H:%M').time()
-        due_time.replace(tzinfo=local_timezone)
 
-    # Create a new quest
-    new_quest = Quest(description=task_description, user_id=user_id, quest_type=task_type, 
-                      due_date=due_date, repeat_days=repeat_days, due_time=due_time, end_of_day=end_of_day, repeat=repeat)
-    new_quest.save()
-
-    return {"success": "Task added successfully!", "task_id": new_quest.id}, 200
+    try:
+        quest = new_quest(
+            user_id,
+            request.form.get('task_description'),
+            request.form.get('task_type', 'daily'),  # Not currently included in form, rather calculated as daily if all days are selected
+            due_date=request.form.get('due_date'),  # 'YYYY-MM-DD'
+            due_time=request.form.get('due_time'),  # 'HH:MM'
+            repeat_days=request.form.getlist('repeat_days'),  # ['Monday', 'Wednesday']
+            end_of_day=bool(request.form.get('end_of_day')),
+            timezone=request.form.get('timezone'),
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    quest.save()
+    rollover_scheduler.schedule(user_id, quest.due_date)
+
+    return {"success": "Task added successfully!", "task_id": quest.id}, 200
 
 @app.route('/api/update_task', methods=['POST'])
+@query_budget(2)
 def update_task():
     """ API request to update an existing task.
         Post:
@@ -439,6 +553,7 @@ def update_task():
     return {"success": "Task updated successfully!"}, 200
 
 @app.route('/api/delete_task', methods=['POST'])
+@query_budget(4)  # settling the pet and the streak score update only if the quest had a streak
 def delete_task():
     """ API request to mark a task as deleted.
         Post:
@@ -461,8 +576,7 @@ def delete_task():
 
     # Mark the task as deleted instead of actually deleting it
     try:
-        db.session.delete(task)
-        db.session.commit()
+        task.delete()
     except Exception as e:
         db.session.rollback()
         return {"error": f"Failed to delete task. Error: {str(e)}"}, 500
@@ -470,6 +584,7 @@ def delete_task():
     return {"success": "Task marked as deleted."}, 200
 
 @app.route('/api/complete_task', methods=['POST'])
+@query_budget(6)  # the completion log and the day's rollup on top of the claim and the pet
 def complete_task():
     """ API request to mark a task as completed.
         Post:
@@ -500,23 +615,32 @@ def complete_task():
 
     # Fetch user pet
     user_id = session.get('user_id')
-    pet = Pet.query.filter_by(user_id=user_id).first()
-
-    if not pet:
-        app.logger.error(f"Pet for user ID {user_id} not found.")
-        return {"error": "Pet not found!"}, 404
 
     # Mark the task as completed and update food quantity
     try:
-        if task.status != 'completed':
-            task.status = 'completed'
-            task.end_time = datetime.now(tz=pytz.utc)
-
-            # Update pet food quantities based on task type
+        # only the request that actually flips the status hands out food, so two tabs can't both claim it
+        now = datetime.now(tz=pytz.utc)
+        claimed = db.session.execute(
+            update(Quest).where(Quest.id == task_id, Quest.status != 'completed')
+            .values(status='completed', end_time=now)
+        ).rowcount
+        mark_user_changed(task.assigned_to)
+
+        if claimed:
+            # logged in the same transaction, rollover will reset the status but not this
+            QuestCompletion.record(task.assigned_to, [(task.id, task.description, task.quest_type)], now)
+
+            # Update pet food quantities based on task type, incremented in SQL so none get lost
+            pet_state = {}
             if task.quest_type == 'daily' or task.quest_type == 'none':
-                pet.food_quantity += 1
+                pet_state = Pet.apply_changes(user_id, food_quantity=1)
             elif task.quest_type == 'weekly' or task.quest_type == 'specific':
-                pet.special_food_quantity += 1
+                pet_state = Pet.apply_changes(user_id, special_food_quantity=1)
+
+            if pet_state is None:
+                db.session.rollback()
+                app.logger.error(f"Pet for user ID {user_id} not found.")
+                return {"error": "Pet not found!"}, 404
 
             app.logger.info(f"Task with ID {task_id} status set to completed. Attempting to commit...")
             db.session.commit()
@@ -528,28 +652,143 @@ def complete_task():
 
     return {"success": "Task marked as completed!", "task_type": task.quest_type}, 200
 
+@app.route('/api/batch', methods=['POST'])
+# one statement per kind of change however many operations: the lookup, the claim, the completion log and
+# its rollup, the pet's food, settling the pet and the streak score for deletes, the insert, and the
+# flushed updates and deletes
+@query_budget(10)
+def batch():
+    """ API request to run several quest operations in one transaction, in order.
+
+        Post (JSON):
+            List -> operations = up to 100 of {"op": "add" | "update" | "delete" | "complete", ...}, each
+                                 with the fields of /api/add_task, /api/update_task, /api/delete_task
+                                 or /api/complete_task
+
+        Return:
+            JSON -> results, one per operation (success, or error and status), plus food_quantity and
+                    special_food_quantity if any food was earned
+            Int -> Return Code
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "Unauthorized"}, 401
+
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if (not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS
+            or not all(isinstance(operation, dict) for operation in operations)):
+        return {"error": f"Expected a list of 1 to {MAX_OPERATIONS} operations!"}, 400
+
+    try:
+        results, pet_state, due_dates = run_batch(user_id, operations)
+    except LookupError as e:
+        db.session.rollback()
+        return {"error": str(e)}, 404
+    except Exception as e:
+        app.logger.error(f"Error occurred while running a batch: {e}", exc_info=True)
+        db.session.rollback()
+        return {"error": f"Failed to run batch. Error: {str(e)}"}, 500
+
+    for due_date in due_dates:
+        rollover_scheduler.schedule(user_id, due_date)
+
+    response = {"results": results}
+    if pet_state:
+        response["food_quantity"] = pet_state["food_quantity"]
+        response["special_food_quantity"] = pet_state["special_food_quantity"]
+    return response, 200
+
 @app.route('/api/completed_tasks', methods=['GET'])
+@query_budget(1)
 def completed_tasks():
+    """ API request for the user's completed tasks from the completion log, newest first, every time a
+        repeating quest was completed rather than just the latest.
+
+        Get:
+            Int -> limit = page size (default 50, max 200)
+            String -> cursor = next_cursor from the previous page
+            String -> since/until = ISO date or datetime bounds on completion time, UTC unless they have an
+                                    offset or Z. A date alone for until takes in that whole day
+            String -> format = 'ndjson' to stream every match, one task per line, instead of a page
+
+        Return:
+            JSON -> tasks and next_cursor (null on the last page), or NDJSON stream
+            Int -> Return Code
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "Unauthorized"}, 401
+
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'), through_day=True)
+        cursor = request.args.get('cursor')
+        cursor = decode_cursor(cursor) if cursor else None
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return {"error": "Invalid limit, cursor or date range!"}, 400
+
+    if limit < 1:
+        return {"error": "Invalid limit, cursor or date range!"}, 400
+
+    query = completed_quests_query(user_id, since, until, cursor)
+
+    # streaming export: rows are fetched in chunks and written out as they arrive
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            rows = db.session.execute(query.execution_options(yield_per=DEFAULT_PAGE_SIZE)).scalars()
+            for task in rows:
+                yield json.dumps(task_json(task)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    # fetch one extra row to know whether there is another page
+    page = db.session.execute(query.limit(limit + 1)).scalars().all()
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+
+    return {"tasks": [task_json(task) for task in page[:limit]], "next_cursor": next_cursor}
+
+
+@app.route('/api/completion_stats', methods=['GET'])
+@query_budget(1)
+def completion_stats():
+    """ API request for how many quests the user completed each day, from the daily rollup.
+
+        Get:
+            Int -> days = how many days back from today, UTC, to cover (default 30, max 366)
+
+        Return:
+            JSON -> days, one {"day", "completions", "special_completions"} per day in the range, oldest first
+            Int -> Return Code
+    """
     user_id = session.get('user_id')
     if not user_id:
         return {"error": "Unauthorized"}, 401
 
-    # Fetch all completed tasks for the user
-    completed_tasks = Quest.query.filter_by(assigned_to=user_id, status='completed').all()
+    try:
+        days = int(request.args.get('days', DEFAULT_STATS_DAYS))
+    except ValueError:
+        return {"error": "Invalid number of days!"}, 400
+    if not 0 < days <= MAX_STATS_DAYS:
+        return {"error": "Invalid number of days!"}, 400
+
+    last_day = datetime.now(tz=pytz.utc).date()
+    first_day = last_day - timedelta(days=days - 1)
+    rows = {row.day: row for row in db.session.execute(daily_completions_query(user_id, first_day, last_day)).scalars()}
 
-    tasks_data = [
-        {
-            "description": task.description,
-            "completed_at": task.end_time.isoformat(),
-            "quest_type": task.quest_type,
-            "is_deleted": False
-        }
-        for task in completed_tasks
-    ]
-    return {"tasks": tasks_data}
+    # days without a row had no completions, filled in so charts get an evenly spaced series
+    series = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        row = rows.get(day)
+        series.append({"day": day.isoformat(),
+                       "completions": row.completions if row else 0,
+                       "special_completions": row.special_completions if row else 0})
+    return {"days": series}
 
 
 @app.route('/logout')
+@query_budget(0)
 def logout():
     if 'user_id' in session:
         session.clear()
@@ -559,12 +798,66 @@ def logout():
     return redirect(url_for('login'))
 
 
+@app.cli.command('repair-streak-scores')
+@click.option('--check', is_flag=True, help="Only report mismatches, don't fix them.")
+def repair_streak_scores_command(check):
+    """ Recomputes User.streak_score from the quest rows and fixes any drift. """
+    mismatches = streak_score_mismatches() if check else repair_streak_scores()
+    for user_id, stored, recomputed in mismatches:
+        print(f"user {user_id}: stored {stored}, quests add up to {recomputed}")
+
+    if check and mismatches:
+        raise SystemExit(1)
+    print(f"{len(mismatches)} streak score(s) {'out of date' if check else 'repaired'}.")
+
+
+@app.cli.command('nightly-maintenance')
+@click.option('--chunk-size', default=500, show_default=True, help="Users per chunk.")
+@click.option('--workers', default=4, show_default=True, help="Worker processes, 1 runs the chunks in this one.")
+@click.option('--restart', is_flag=True, help="Start from the first user instead of resuming an interrupted run.")
+def nightly_maintenance_command(chunk_size, workers, restart):
+    """ Rolls over every user's past-due quests and settles every pet's decay, in chunks. """
+    def progress(totals):
+        rate = totals['users'] / totals['seconds'] if totals['seconds'] else 0
+        print(f"{totals['users']}/{totals['total_users']} users, {totals['quests_rolled']} quests rolled over, "
+              f"{totals['pets_settled']} pets settled ({rate:.0f} users/s)")
+
+    totals = run_maintenance(app, chunk_size=chunk_size, workers=workers, restart=restart, progress=progress)
+    if totals['resumed_after'] is not None:
+        print(f"Resumed an interrupted run after user {totals['resumed_after']}.")
+    rate = totals['users'] / totals['seconds'] if totals['seconds'] else 0
+    print(f"Done: {totals['users']} users in {totals['seconds']:.1f}s ({rate:.0f} users/s), "
+          f"{totals['quests_rolled']} quests rolled over, {totals['pets_settled']} pets settled.")
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """ Writes hashed copies and resized WebP/AVIF variants of static files to static/dist. """
+    manifest = build_assets(app.static_folder)
+
+    before = sum(entry['bytes'] for entry in manifest.values())
+    print(f"{len(manifest)} files, {before} bytes of originals")
+    for name, entry in sorted(manifest.items()):
+        if entry['variants']:
+            smallest = min(entry['variants'], key=lambda v: v['bytes'])
+            print(f"    {name}: {entry['bytes']} -> {smallest['bytes']} bytes ({smallest['format']}, {smallest['width']}w)")
+
+
+@app.cli.command('load-presets')
+def load_presets_command():
+    """ Seeds the quest template catalog if it is empty. """
+    if QuestTemplate.query.first():
+        print("Quest templates already loaded.")
+        return
+    print(f"Loaded {len(load_presets())} quest templates.")
+
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
-        user = User.query.filter_by(username="fake_user").first()
-        if not user:
+        if not QuestTemplate.query.first():
             load_presets()
+        quest_catalog.load()
     # app.app_context().push()
     
 
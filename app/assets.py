@@ -0,0 +1,261 @@
+""" Static asset pipeline.
+
+    'flask build-assets' copies everything under static/ into static/dist/ with
+    a content hash in the filename, writes resized WebP/AVIF variants of the
+    raster images and a sprite atlas per pet (see sprites.py), and records it
+    all in static/dist/manifest.json. Text assets (the home.css/home.js
+    bundles, atlas JSON) also get .gz/.br siblings. Templates go through
+    asset_url()/asset_srcset() so they pick up the hashed names, and anything
+    under dist/ is served precompressed with a one-year immutable Cache-Control.
+
+    Without a build (plain dev checkout) the helpers fall back to the
+    original files, so nothing breaks.
+"""
+from flask import request, url_for, send_from_directory
+from hashlib import sha256
+from io import BytesIO
+from sprites import pet_dirs, pack_pet_atlas, atlas_name
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is only needed to build variants, not to serve them
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # without it we only precompress with gzip
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+IMAGE_WIDTHS = (200, 400, 800)
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.html', '.txt')
+CSS_URL = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+
+
+def hashed_name(name, data, suffix=''):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}{suffix}.{sha256(data).hexdigest()[:12]}{ext}"
+
+
+def write_hashed(dist_folder, name, data, suffix=''):
+    """ Writes data under dist/ with its hash in the name, returns the path relative to static/. """
+    path = hashed_name(name, data, suffix)
+    target = os.path.join(dist_folder, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+    return f"{DIST_DIR}/{path}".replace(os.sep, '/')
+
+
+def variant_formats():
+    formats = ['webp']
+    if features.check('avif'):
+        formats.append('avif')
+    return formats
+
+
+def encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, image_format.upper(), quality=80)
+    return buffer.getvalue()
+
+
+def build_image_variants(dist_folder, name, data):
+    """ Resized copies of one image in its own format plus WebP/AVIF, widest first. """
+    original = Image.open(BytesIO(data))
+    original.load()
+    original_format = 'png' if name.lower().endswith('.png') else 'jpeg'
+
+    # never upscale, and always include a full size variant
+    widths = [width for width in IMAGE_WIDTHS if width < original.width] + [original.width]
+
+    variants = []
+    for width in sorted(widths, reverse=True):
+        image = original
+        if width != original.width:
+            height = round(original.height * width / original.width)
+            image = original.resize((width, height), Image.LANCZOS)
+
+        for image_format in [original_format] + variant_formats():
+            encoded = encode(image, image_format)
+            variant_name = os.path.splitext(name)[0] + '.' + ('jpg' if image_format == 'jpeg' else image_format)
+            variants.append({
+                "path": write_hashed(dist_folder, variant_name, encoded, suffix=f"-{width}w"),
+                "width": width,
+                "format": image_format,
+                "bytes": len(encoded),
+            })
+
+    return variants
+
+
+def precompress(dist_folder, path, data):
+    """ Writes .gz (and .br when brotli is installed) next to a text asset so it is never compressed per request. """
+    target = os.path.join(dist_folder, os.path.relpath(path, DIST_DIR))
+    with open(target + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(target + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def rewrite_css_urls(name, data, manifest):
+    """ Points relative url()s in a stylesheet at the hashed copies, relative to where the stylesheet ends up. """
+    css_dir = posixpath.dirname(name)
+    dist_dir = posixpath.dirname(f"{DIST_DIR}/{name}")
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        entry = manifest.get(posixpath.normpath(posixpath.join(css_dir, url)))
+        if not entry:
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(entry['src'], dist_dir)}{quote})"
+
+    return CSS_URL.sub(replace, data.decode()).encode()
+
+
+def build_assets(static_folder):
+    """ Rebuilds static/dist and its manifest from scratch. Returns the manifest. """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist_folder, ignore_errors=True)
+    os.makedirs(dist_folder)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_folder]
+        names.extend(os.path.relpath(os.path.join(root, filename), static_folder).replace(os.sep, '/')
+                     for filename in files)
+
+    # stylesheets last, they need the hashed names of what they point at
+    names.sort(key=lambda name: (name.endswith('.css'), name))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = rewrite_css_urls(name, data, manifest)
+
+        entry = {"src": write_hashed(dist_folder, name, data), "bytes": len(data), "variants": []}
+        if Image is not None and name.lower().endswith(IMAGE_EXTENSIONS):
+            entry["variants"] = build_image_variants(dist_folder, name, data)
+        if name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            precompress(dist_folder, entry["src"], data)
+        manifest[name] = entry
+
+    # one sprite atlas per pet, the JSON names its PNG relative to itself
+    if Image is not None:
+        for pet_dir in pet_dirs(static_folder):
+            pet_type = os.path.basename(pet_dir)
+            atlas, metadata = pack_pet_atlas(pet_dir)
+            image_path = write_hashed(dist_folder, f"{os.path.dirname(atlas_name(pet_type))}/atlas.png", atlas)
+            metadata["image"] = os.path.basename(image_path)
+
+            data = json.dumps(metadata, sort_keys=True).encode()
+            json_path = write_hashed(dist_folder, atlas_name(pet_type), data)
+            precompress(dist_folder, json_path, data)
+            manifest[atlas_name(pet_type)] = {"src": json_path, "bytes": len(data), "variants": []}
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+class AssetManifest:
+
+    def __init__(self, static_folder):
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+        self._entries = {}
+        self._mtime = None
+
+    def entries(self):
+        # reload when the file changes so a rebuild doesn't need a restart
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._entries, self._mtime = {}, None
+            return self._entries
+
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+            self._mtime = mtime
+        return self._entries
+
+    def built(self, name):
+        return name in self.entries()
+
+    def url(self, name, width=None, image_format=None):
+        """ URL for a static file, the hashed copy if built. With width/format, the closest variant at least that wide. """
+        entry = self.entries().get(name)
+        if not entry:
+            return url_for('static', filename=name)
+
+        path = entry["src"]
+        if width and image_format is None:
+            image_format = 'png' if name.lower().endswith('.png') else 'jpeg'
+        if width or image_format:
+            candidates = [v for v in entry["variants"]
+                          if (image_format is None or v["format"] == image_format)
+                          and (width is None or v["width"] >= width)]
+            if candidates:
+                path = min(candidates, key=lambda v: v["width"])["path"]
+        return url_for('static', filename=path)
+
+    def srcset(self, name, image_format):
+        """ srcset string of every width for one format, empty if there's no build. """
+        entry = self.entries().get(name)
+        if not entry:
+            return ''
+        return ', '.join(f"{url_for('static', filename=v['path'])} {v['width']}w"
+                         for v in entry["variants"] if v["format"] == image_format)
+
+
+def send_dist_file(dist_folder, filename):
+    """ Serves a hashed file, preferring a precompressed sibling the client accepts. """
+    accepted = request.accept_encodings
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(dist_folder, filename + suffix)):
+            response = send_from_directory(dist_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist_folder, filename)
+
+    if filename.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    # the hash changes whenever the content does, so these can be cached forever
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    return response
+
+
+def init_assets(app):
+    manifest = AssetManifest(app.static_folder)
+    app.jinja_env.globals['asset_url'] = manifest.url
+    app.jinja_env.globals['asset_srcset'] = manifest.srcset
+    app.jinja_env.globals['asset_built'] = manifest.built
+
+    # more specific than the default /static/<path:filename>, so url_for('static', ...) still works
+    dist_folder = os.path.join(app.static_folder, DIST_DIR)
+    app.add_url_rule(f"{app.static_url_path}/{DIST_DIR}/<path:filename>", 'dist_asset',
+                     lambda filename: send_dist_file(dist_folder, filename))
+
+    return manifest
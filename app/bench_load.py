@@ -0,0 +1,178 @@
+""" Load generation benchmark for the app's endpoints.
+
+    Seeds a throwaway database with N users, each with a pet and M quests,
+    then replays user sessions through the Flask test client from several
+    threads at once:
+
+        login -> home -> home_state -> complete_task -> feed_pet -> play_with_pet -> completed_tasks
+
+    and reports, per endpoint, p50/p95/p99 latency, requests per second and
+    SQL statements per request, as JSON so runs can be diffed across commits.
+    Statements are counted on the request's own thread, so background work
+    (rollover, the interaction buffer flush) isn't charged to an endpoint.
+
+    Logins use a cheap password hash cost by default so the numbers show the
+    app rather than the KDF; bench_passwords.py covers that separately.
+
+    Usage:
+        python app/bench_load.py [--users 50] [--quests 10] [--sessions 200] [--concurrency 8]
+                                 [--password-cost 1000] [--output results.json]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PASSWORD = 'bench-password'
+
+counter = threading.local()
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(counter, 'active', False):
+        counter.statements += 1
+
+
+def seed(app, users, quests):
+    from app import password_hasher
+    from models import db, User, Quest, Pet
+
+    password_hash = password_hasher.hash(PASSWORD)
+    with app.app_context():
+        for i in range(users):
+            user = User(username=f'load_user_{i}', email=f'load_user_{i}@example.com', password_hash=password_hash)
+            user.onboarding_stage = 'done'
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Pet(user_id=user.id, pet_type='Dog_Brown', food_quantity=5, special_food_quantity=5))
+            db.session.add_all(Quest(description=f'Quest {j}', user_id=user.id, quest_type='daily', repeat_days=[])
+                               for j in range(quests))
+        db.session.commit()
+
+
+def timed(results, name, call):
+    counter.statements = 0
+    counter.active = True
+    start = time.perf_counter()
+    try:
+        response = call()
+    finally:
+        counter.active = False
+    results.append((name, time.perf_counter() - start, counter.statements, response.status_code))
+    return response
+
+
+def session(app, user_index, rng):
+    """ One user's visit. Returns a list of (endpoint, seconds, statements, status). """
+    results = []
+    client = app.test_client()
+
+    timed(results, 'POST /login', lambda: client.post('/login', data={
+        'username': f'load_user_{user_index}', 'password': PASSWORD}))
+    timed(results, 'GET /home', lambda: client.get('/home'))
+    state = timed(results, 'GET /api/home_state', lambda: client.get('/api/home_state')).get_json() or {}
+
+    open_quests = [quest['id'] for quest in state.get('quests', []) if quest['status'] != 'completed']
+    if open_quests:
+        task_id = rng.choice(open_quests)
+        timed(results, 'POST /api/complete_task', lambda: client.post('/api/complete_task', data={'task_id': task_id}))
+
+    timed(results, 'POST /api/feed_pet', lambda: client.post('/api/feed_pet', data={'type': rng.choice(['food', 'special'])}))
+    for _ in range(rng.randint(1, 5)):  # people click the pet more than once
+        timed(results, 'POST /api/play_with_pet', lambda: client.post('/api/play_with_pet'))
+    timed(results, 'GET /api/completed_tasks', lambda: client.get('/api/completed_tasks?limit=50'))
+    return results
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarise(results, elapsed):
+    endpoints = {}
+    for name in sorted({name for name, *_ in results}):
+        rows = [row for row in results if row[0] == name]
+        timings = sorted(seconds * 1000 for _, seconds, _, _ in rows)
+        statements = [count for _, _, count, _ in rows]
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for *_, status in rows if status >= 400),
+            "rps": round(len(rows) / elapsed, 2),
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "sql_mean": round(sum(statements) / len(statements), 2),
+            "sql_max": max(statements),
+        }
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--quests', type=int, default=10)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--password-cost', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # the app reads its database and hashing settings from the environment at import
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+    os.environ['PASSWORD_HASH_COST'] = str(args.password_cost)
+    from app import app, interaction_buffer
+    from models import db
+    from sqlalchemy import event
+
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+    seed(app, args.users, args.quests)
+
+    rng = random.Random(args.seed)
+    plan = [(rng.randrange(args.users), random.Random(rng.random())) for _ in range(args.sessions)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = [row for rows in pool.map(lambda visit: session(app, *visit), plan) for row in rows]
+    elapsed = time.perf_counter() - start
+    interaction_buffer.stop()
+
+    report = {
+        "commit": git_commit(),
+        "run_at": datetime.now().isoformat(timespec='seconds'),
+        "settings": {key: value for key, value in vars(args).items() if key != 'output'},
+        "total": {
+            "requests": len(results),
+            "seconds": round(elapsed, 3),
+            "rps": round(len(results) / elapsed, 2),
+        },
+        "endpoints": summarise(results, elapsed),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
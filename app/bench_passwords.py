@@ -0,0 +1,64 @@
+""" Benchmark for password verification: logins/sec against KDF cost.
+
+    Hashes one password at each cost, then has a burst of concurrent "logins"
+    verify it through a PasswordHasher with a fixed number of pool workers,
+    the same path /login takes. The legacy sha256 row is the old baseline.
+
+    Usage:
+        python app/bench_passwords.py [--scheme pbkdf2_sha256] [--costs 100000 300000 600000]
+                                      [--workers 2] [--logins 64] [--clients 16]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from passwords import PasswordHasher, make_scheme
+import argparse
+import time
+
+PASSWORD = 'correct horse battery staple'
+DEFAULT_COSTS = {
+    'pbkdf2_sha256': [100000, 300000, 600000, 1200000],
+    'scrypt': [2 ** 13, 2 ** 14, 2 ** 15],
+}
+
+
+def run(hasher, encoded, logins, clients):
+    """ Returns (logins per second, median ms per login) for a burst of concurrent verifies. """
+    def login(_):
+        start = time.perf_counter()
+        assert hasher.verify(PASSWORD, encoded)
+        return time.perf_counter() - start
+
+    # clients stand in for request threads, all waiting on the same pool
+    with ThreadPoolExecutor(clients) as requests:
+        start = time.perf_counter()
+        timings = list(requests.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+
+    return logins / elapsed, sorted(timings)[logins // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scheme', choices=sorted(DEFAULT_COSTS), default='pbkdf2_sha256')
+    parser.add_argument('--costs', type=int, nargs='+')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+
+    rows = [('sha256', None, sha256(PASSWORD.encode()).hexdigest())]
+    for cost in args.costs or DEFAULT_COSTS[args.scheme]:
+        scheme = make_scheme(args.scheme, cost)
+        rows.append((args.scheme, cost, scheme.hash(PASSWORD)))
+
+    print(f"{args.workers} hashing workers, {args.clients} concurrent clients, {args.logins} logins per run")
+    print(f"{'scheme':>14} {'cost':>9} {'logins/s':>10} {'median ms':>10}")
+    for name, cost, encoded in rows:
+        scheme = make_scheme(name, cost) if cost else None
+        hasher = PasswordHasher(scheme, max_workers=args.workers, max_pending=args.logins)
+        per_second, millis = run(hasher, encoded, args.logins, args.clients)
+        print(f"{name:>14} {cost or '-':>9} {per_second:>10.1f} {millis:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
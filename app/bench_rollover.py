@@ -0,0 +1,100 @@
+""" Benchmark for quest rollover: per-quest reset_due_date vs rollover_user_quests.
+
+    Seeds a throwaway SQLite file with one user holding N overdue quests and
+    times a single "request worth" of rollover each way, counting commits.
+
+    Usage:
+        python app/bench_rollover.py [--sizes 10 100 1000] [--rounds 5]
+"""
+from flask import Flask
+from models import db, User, Quest
+from rollover import rollover_user_quests
+from sqlalchemy import event, update
+from datetime import datetime, timedelta
+import argparse
+import os
+import pytz
+import tempfile
+import time
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+
+def seed(size):
+    user = User(username='bench_user', email='bench_user@example.com', password_hash='x')
+    user.save()
+
+    quest_types = ['daily', 'weekly', 'specific', 'none']
+    for i in range(size):
+        quest_type = quest_types[i % len(quest_types)]
+        quest = Quest(description=f'Quest {i}', user_id=user.id, quest_type=quest_type,
+                      repeat_days=['Monday', 'Thursday'] if quest_type == 'specific' else [],
+                      repeat=quest_type != 'none')
+        db.session.add(quest)
+    db.session.commit()
+    return user.id
+
+
+def make_overdue(user_id):
+    db.session.execute(
+        update(Quest).where(Quest.assigned_to == user_id)
+        .values(due_date=datetime.now(tz=pytz.utc) - timedelta(hours=2), status='completed')
+    )
+    db.session.commit()
+
+
+def legacy_rollover(user_id):
+    for quest in Quest.query.filter_by(assigned_to=user_id).all():
+        quest.reset_due_date()
+
+
+def run(size, rounds):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path)
+    results = {}
+
+    with app.app_context():
+        db.create_all()
+        user_id = seed(size)
+
+        commits = []
+        event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+
+        for name, rollover in (('reset_due_date', legacy_rollover), ('bulk', rollover_user_quests)):
+            timings = []
+            commit_counts = []
+            for _ in range(rounds):
+                make_overdue(user_id)
+                db.session.expunge_all()
+                commits.clear()
+
+                start = time.perf_counter()
+                rollover(user_id)
+                timings.append(time.perf_counter() - start)
+                commit_counts.append(len(commits))
+
+            results[name] = (sum(commit_counts) / rounds, sorted(timings)[rounds // 2] * 1000)
+
+    os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'quests':>8} {'strategy':>15} {'commits':>8} {'median ms':>10}")
+    for size in args.sizes:
+        for name, (commits, millis) in run(size, args.rounds).items():
+            print(f"{size:>8} {name:>15} {commits:>8.0f} {millis:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+""" Throughput benchmark for the SQLite engine profiles under mixed read/write load.
+
+    For each profile, seeds a throwaway database with users, pets and quests,
+    then runs client processes for a fixed time. Each operation is either a home
+    state read or a write (a food increment or completing a quest), picked at
+    the given write ratio. Reports operations/sec, p95 latency and how many
+    operations failed with "database is locked".
+
+    Usage:
+        python app/bench_sqlite.py [--profiles default tuned] [--processes 4] [--seconds 10]
+                                   [--write-ratio 0.2] [--users 50]
+"""
+from flask import Flask
+from database import init_database
+from models import db, User, Quest, Pet
+from homestate import load_snapshot
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import os
+import pytz
+import random
+import tempfile
+import time
+
+
+def make_app(path, profile):
+    app = Flask(__name__)
+    init_database(app, {'DATABASE_URL': f'sqlite:///{path}', 'SQLITE_PROFILE': profile})
+    return app
+
+
+def seed(users, quests_per_user=10):
+    for i in range(users):
+        user = User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Pet(user_id=user.id, pet_type='Dog_Brown'))
+        db.session.add_all(Quest(description=f'Quest {j}', user_id=user.id, quest_type='daily', repeat_days=[])
+                           for j in range(quests_per_user))
+    db.session.commit()
+
+
+def write(rng, user_id):
+    if rng.random() < 0.5:
+        Pet.apply_changes(user_id, food_quantity=1)
+    else:
+        db.session.execute(
+            update(Quest).where(Quest.assigned_to == user_id, Quest.status != 'completed')
+            .values(status='completed', end_time=datetime.now(tz=pytz.utc))
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def client(path, profile, seed_value, start_at, seconds, write_ratio, users):
+    # one process per client, like separate app workers, each with its own engine
+    app = make_app(path, profile)
+    rng = random.Random(seed_value)
+    stats = {"reads": 0, "writes": 0, "locked": 0, "timings": []}
+
+    time.sleep(max(0, start_at - time.time()))
+    deadline = start_at + seconds
+    with app.app_context():
+        while time.time() < deadline:
+            user_id = rng.randint(1, users)
+            is_write = rng.random() < write_ratio
+            start = time.perf_counter()
+            try:
+                if is_write:
+                    write(rng, user_id)
+                else:
+                    load_snapshot(user_id)  # uncached, this is measuring the database
+                    db.session.rollback()  # end the read transaction like a request would
+            except OperationalError:
+                db.session.rollback()
+                stats["locked"] += 1
+                continue
+            stats["timings"].append(time.perf_counter() - start)
+            stats["writes" if is_write else "reads"] += 1
+        db.engine.dispose()
+
+    return stats
+
+
+def run(profile, processes, seconds, write_ratio, users):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path, profile)
+    with app.app_context():
+        db.create_all()
+        seed(users)
+        db.engine.dispose()
+
+    # a moment for every process to start, then they all go at once
+    start_at = time.time() + 2
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(client, path, profile, i, start_at, seconds, write_ratio, users)
+                   for i in range(processes)]
+        results = [future.result() for future in futures]
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    timings = sorted(t for stats in results for t in stats["timings"])
+    return {
+        "reads": sum(stats["reads"] for stats in results) / seconds,
+        "writes": sum(stats["writes"] for stats in results) / seconds,
+        "locked": sum(stats["locked"] for stats in results),
+        "p95_ms": timings[int(len(timings) * 0.95)] * 1000 if timings else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['default', 'tuned'])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes, {args.seconds:g}s, {args.write_ratio:.0%} writes, {args.users} users")
+    print(f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'total/s':>9} {'p95 ms':>8} {'locked':>7}")
+    for profile in args.profiles:
+        result = run(profile, args.processes, args.seconds, args.write_ratio, args.users)
+        print(f"{profile:>8} {result['reads']:>9.1f} {result['writes']:>9.1f} "
+              f"{result['reads'] + result['writes']:>9.1f} {result['p95_ms']:>8.2f} {result['locked']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+""" In-memory cache of the quest template catalog.
+
+    Templates are read once and kept as plain dicts, so the onboarding page
+    and adopting templates never touch the template table. Any insert,
+    update or delete of a QuestTemplate through the ORM drops the cache in
+    this process, and a TTL bounds how stale another worker's copy can get.
+"""
+from models import db, Quest, QuestTemplate, mark_user_changed
+from sqlalchemy import event, select, insert
+from datetime import datetime, timedelta
+import pytz
+import threading
+import time
+
+
+class QuestCatalog:
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._templates = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(QuestTemplate, event_name, lambda *args: self.invalidate())
+
+    def load(self):
+        templates = db.session.execute(select(QuestTemplate).order_by(QuestTemplate.id)).scalars()
+        loaded = {
+            template.id: {
+                "id": template.id,
+                "description": template.description,
+                "quest_type": template.quest_type,
+                "reward": template.reward,
+                "repeat_days": list(template.repeat_days or []),
+                "end_of_day": template.end_of_day,
+                "repeat": template.repeat,
+            }
+            for template in templates
+        }
+        with self._lock:
+            self._templates = loaded
+            self._loaded_at = time.monotonic()
+        return loaded
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+    def _current(self):
+        with self._lock:
+            templates = self._templates
+            fresh = templates is not None and time.monotonic() - self._loaded_at < self.ttl
+        return templates if fresh else self.load()
+
+    def templates(self):
+        return list(self._current().values())
+
+    def get_many(self, template_ids):
+        """ Templates for the given ids, in that order, ignoring ids that don't exist. """
+        templates = self._current()
+        return [templates[template_id] for template_id in template_ids if template_id in templates]
+
+    def adopt(self, user_id, template_ids):
+        """ Copies the chosen templates into quests for a user with one bulk insert and one commit.
+
+            Returns:
+                Int -> how many quests were added
+        """
+        quests = []
+        for template in self.get_many(template_ids):
+            quest = Quest(
+                description=template["description"],
+                user_id=user_id,
+                quest_type=template["quest_type"],
+                weight=template["reward"],
+                due_date=datetime.now(tz=pytz.utc) + timedelta(days=1),
+                repeat_days=[],
+                end_of_day=template["end_of_day"],
+                repeat=template["repeat"])
+            # templates already store day numbers, not names
+            if template["repeat_days"]:
+                quest.repeat_days = list(template["repeat_days"])
+            quests.append(quest)
+
+        if quests:
+            # Quest() works out the defaults, but adding the objects would insert them one row at a time
+            # to get each id back, so insert their values in a single executemany instead
+            db.session.execute(insert(Quest), [
+                {key: value for key, value in vars(quest).items() if not key.startswith('_')}
+                for quest in quests
+            ])
+            mark_user_changed(user_id)
+            db.session.commit()
+        return len(quests)
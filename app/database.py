@@ -0,0 +1,93 @@
+""" Database engine settings, read from the environment.
+
+    DATABASE_URL            database to use, default sqlite:///data.db (in the instance folder)
+    SQLITE_PROFILE          'tuned' (default) or 'default' for SQLite's own settings
+    SQLITE_JOURNAL_MODE     \
+    SQLITE_SYNCHRONOUS       |
+    SQLITE_MMAP_SIZE         |  override one pragma of the profile
+    SQLITE_CACHE_SIZE        |
+    SQLITE_BUSY_TIMEOUT     /
+    DB_POOL_SIZE            connections kept open per process, default 5
+    DB_MAX_OVERFLOW         extra connections allowed under load, default 10
+    DB_POOL_TIMEOUT         seconds to wait for a free connection, default 30
+
+    The tuned profile puts the database in WAL mode so readers never wait on
+    a writer, syncs at the end of each WAL checkpoint rather than every commit,
+    memory maps the file and waits up to 5s for a busy lock instead of
+    failing with "database is locked". The pragmas are set on every new
+    connection.
+"""
+from models import db
+from sqlalchemy import event
+import re
+
+DEFAULT_DATABASE_URL = 'sqlite:///data.db'
+
+# applied in this order, busy_timeout first so switching to WAL waits for other connections
+PRAGMAS = ('busy_timeout', 'journal_mode', 'synchronous', 'mmap_size', 'cache_size')
+
+PROFILES = {
+    'default': {},
+    'tuned': {
+        'busy_timeout': 5000,         # ms
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',      # safe with WAL, only a power cut can lose the last commits
+        'mmap_size': 256 * 1024 ** 2,
+        'cache_size': -64000,         # negative is KiB, so 64MB
+    },
+}
+
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def sqlite_pragmas(environ):
+    """ The pragmas for SQLITE_PROFILE with any single-pragma overrides applied. """
+    profile = environ.get('SQLITE_PROFILE', 'tuned')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {profile!r}, expected one of {', '.join(PROFILES)}")
+
+    pragmas = dict(PROFILES[profile])
+    for name in PRAGMAS:
+        value = environ.get(f'SQLITE_{name.upper()}')
+        if value is not None:
+            # these end up in a PRAGMA statement, which can't take bound parameters
+            if not PRAGMA_VALUE.match(value):
+                raise ValueError(f"Invalid value {value!r} for SQLITE_{name.upper()}")
+            pragmas[name] = value
+    return pragmas
+
+
+def engine_options(environ, url):
+    if url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url):
+        return {}  # in-memory SQLite uses a single connection, pool sizes don't apply
+
+    return {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+
+
+def init_database(app, environ):
+    """ Configures and initialises db for the app from environ, returns the pragmas in use. """
+    url = environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(environ, url)
+    db.init_app(app)
+
+    if not url.startswith('sqlite'):
+        return {}
+
+    pragmas = sqlite_pragmas(environ)
+    if pragmas:
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name in PRAGMAS:
+                if name in pragmas:
+                    cursor.execute(f"PRAGMA {name}={pragmas[name]}")
+            cursor.close()
+
+        with app.app_context():
+            event.listen(db.engine, 'connect', set_pragmas)
+
+    return pragmas
@@ -0,0 +1,84 @@
+from models import QuestCompletion, DailyCompletion
+from sqlalchemy import select, tuple_
+from datetime import datetime, timedelta
+import pytz
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+
+
+def parse_time(value, through_day=False):
+    """ ISO date or datetime from a query string, treated as UTC when it has no offset.
+
+        Returned as naive UTC, the way SQLite stores the times it's compared with, so an offset
+        like +02:00 moves the bound instead of being dropped. A trailing Z, as JavaScript's
+        toISOString() sends, is read as +00:00, which fromisoformat only does itself from Python 3.11.
+
+        With through_day set a date on its own means the start of the next day, so as an exclusive
+        upper bound it still takes in the whole of the day given.
+    """
+    if not value:
+        return None
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if through_day and len(value) == len('YYYY-MM-DD'):
+        parsed += timedelta(days=1)
+    if parsed.tzinfo is None:
+        return parsed
+    return parsed.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def encode_cursor(completion):
+    return f"{completion.completed_at.isoformat()}|{completion.id}"
+
+
+def decode_cursor(cursor):
+    """ Turns a cursor from a previous page back into (completed_at, id). Raises ValueError if it's garbage. """
+    completed_at, completion_id = cursor.rsplit('|', 1)
+    return datetime.fromisoformat(completed_at), int(completion_id)
+
+
+def completed_quests_query(user_id, since=None, until=None, cursor=None):
+    """ A user's quest completions from the log, newest first, ordered on (completed_at, id) so it can be
+        paged by keyset. A repeating quest shows up once per time it was completed.
+    """
+    query = (
+        select(QuestCompletion)
+        .where(QuestCompletion.user_id == user_id)
+        .order_by(QuestCompletion.completed_at.desc(), QuestCompletion.id.desc())
+    )
+
+    if since:
+        query = query.where(QuestCompletion.completed_at >= since)
+    if until:
+        query = query.where(QuestCompletion.completed_at < until)
+    if cursor:
+        query = query.where(tuple_(QuestCompletion.completed_at, QuestCompletion.id) < tuple_(*cursor))
+
+    return query
+
+
+def daily_completions_query(user_id, first_day, last_day):
+    """ The user's DailyCompletion rows from first_day to last_day inclusive, oldest first. Days with no
+        completions have no row.
+    """
+    return (
+        select(DailyCompletion)
+        .where(DailyCompletion.user_id == user_id,
+               DailyCompletion.day >= first_day,
+               DailyCompletion.day <= last_day)
+        .order_by(DailyCompletion.day)
+    )
+
+
+def task_json(completion):
+    return {
+        "id": completion.quest_id,
+        "description": completion.description,
+        "completed_at": completion.completed_at.isoformat(),
+        "quest_type": completion.quest_type,
+        "is_deleted": False
+    }
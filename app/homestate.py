@@ -0,0 +1,112 @@
+from models import db, User, Quest, Pet, decayed_stats
+from sqlalchemy import select, and_
+from datetime import datetime
+import pytz
+
+
+def load_snapshot(user_id):
+    """ Everything the pet and home endpoints read for one user, from a single joined query.
+
+        This is what the StateCache keeps, so it's plain JSON-able data. The pet's happiness and
+        hunger are as stored, pet_stats() works out where they've decayed to.
+
+        Returns:
+            Dict -> username, pet (or None) and active quests, or None if the user doesn't exist
+    """
+    rows = db.session.execute(
+        select(User, Pet, Quest)
+        .outerjoin(Pet, Pet.user_id == User.id)
+        .outerjoin(Quest, and_(Quest.assigned_to == User.id,
+                               Quest.status.notin_(['inactive', 'completed'])))
+        .where(User.id == user_id)
+        .order_by(Quest.id)
+    ).all()
+
+    if not rows:
+        return None
+
+    user, pet = rows[0][0], rows[0][1]
+
+    pet_snapshot = None
+    if pet:
+        # pets from before decay_from existed count from the user's last update like they used to
+        decay_from = pet.decay_from or user.account_updated
+        if decay_from.tzinfo is None:
+            decay_from = decay_from.replace(tzinfo=pytz.utc)
+        pet_snapshot = {
+            "id": pet.id,
+            "user_id": user.id,
+            "name": pet.name,
+            "pet_type": pet.pet_type,
+            "happiness": pet.happiness,
+            "hunger": pet.hunger,
+            "food_quantity": pet.food_quantity,
+            "special_food_quantity": pet.special_food_quantity,
+            "decay_from": decay_from.isoformat(),
+            "decay_rates": list(user.pet_decay_rates()),
+        }
+
+    return {
+        "username": user.username,
+        "pet": pet_snapshot,
+        "quests": [
+            {
+                "id": quest.id,
+                "description": quest.description,
+                "quest_type": quest.quest_type,
+                "status": quest.status,
+                "streak": quest.streak,
+                "due_date": quest.due_date.isoformat() if quest.due_date else None,
+            }
+            for _, _, quest in rows if quest is not None
+        ],
+    }
+
+
+def pet_stats(pet, now=None):
+    """ A snapshot's pet stats and food as of now, decayed from the stored values.
+
+        Returns:
+            Dict -> happiness, hunger, food_quantity, special_food_quantity
+    """
+    now = now or datetime.now(tz=pytz.utc)
+    happiness, hunger = decayed_stats(pet["happiness"], pet["hunger"], datetime.fromisoformat(pet["decay_from"]),
+                                      pet["decay_rates"], now)
+    return {"happiness": happiness, "hunger": hunger, "food_quantity": pet["food_quantity"],
+            "special_food_quantity": pet["special_food_quantity"]}
+
+
+def load_home_state(user_id, state_cache, interactions=None):
+    """ Everything the home page needs for one user, from the user's cached snapshot.
+
+        Pass the InteractionBuffer as interactions to include plays and feeds it hasn't written yet.
+
+        Returns:
+            Dict -> pet stats, food inventory and active quests, or None if the user doesn't exist
+    """
+    snapshot = state_cache.get(user_id)
+    if snapshot is None:
+        return None
+
+    pet = snapshot["pet"]
+    pet_state = None
+    inventory = {"food_quantity": 0, "special_food_quantity": 0}
+    if pet:
+        stats = interactions.project(pet) if interactions else pet_stats(pet)
+        pet_state = {
+            "name": pet["name"],
+            "pet_type": pet["pet_type"],
+            "happiness": stats["happiness"],
+            "hunger": stats["hunger"],
+        }
+        inventory = {
+            "food_quantity": stats["food_quantity"],
+            "special_food_quantity": stats["special_food_quantity"],
+        }
+
+    return {
+        "username": snapshot["username"],
+        "pet": pet_state,
+        "inventory": inventory,
+        "quests": list(snapshot["quests"]),
+    }
@@ -0,0 +1,240 @@
+""" Write-coalescing buffer for playing with and feeding pets.
+
+    Clicks on the pet don't write anything. Each one adds to a per-pet tally of
+    happiness, hunger and food changes held in memory, and a background
+    thread writes all the tallies out in one transaction every couple of
+    seconds, or sooner once enough clicks have piled up. Responses are worked
+    out from the user's cached snapshot (see statecache.py) plus whatever is
+    still waiting, so they come out the same as if every click had been
+    written straight away, and a click usually doesn't read anything either.
+
+    Tallies are deltas, not absolute values, so they add up correctly with
+    writes from other workers and with food earned from completing quests.
+    Whatever is still waiting when the process exits gets flushed then.
+
+    Whether there's food left to feed with is decided from the projection,
+    which can be behind (another worker fed the same pet, or its snapshot is
+    older than this one's), so the flush only writes a tally with feeds in it
+    if the row still has that food. If it doesn't, the feeds are dropped and
+    only the plays are written, rather than the pet getting fed for free.
+"""
+from models import db, Pet, feed_changes, mark_user_changed
+from homestate import pet_stats
+from sqlalchemy import bindparam
+from dataclasses import dataclass
+from datetime import datetime
+import atexit
+import logging
+import os
+import pytz
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingInteraction:
+    happiness: int = 0
+    hunger: int = 0
+    food_quantity: int = 0
+    special_food_quantity: int = 0
+
+
+class InteractionBuffer:
+
+    def __init__(self, app, state_cache, flush_interval=2, max_pending=200):
+        self.app = app
+        self.state_cache = state_cache
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = {}  # user id -> PendingInteraction
+        self._count = 0
+        self.feeds_written = 0
+        self.feeds_rejected = 0
+        # held while a flush commits, so a pet is never read halfway through one
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+        atexit.register(self.stop)
+
+    def ensure_started(self):
+        # threads don't survive a fork, so every worker process starts its own
+        if self._pid != os.getpid():
+            self._pending = {}
+            self._count = 0
+            self.feeds_written = self.feeds_rejected = 0
+            self.start()
+
+    def start(self):
+        self._pid = os.getpid()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='interaction-buffer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the flush thread and writes out anything still waiting. """
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self._thread = None
+        if self._pid == os.getpid():
+            self.flush()
+
+    def project(self, pet, now=None):
+        """ The pet's stats and food as they will be once everything waiting is written.
+
+            pet is the pet from the user's snapshot, see homestate.load_snapshot.
+
+            Returns:
+                Dict -> happiness, hunger, food_quantity, special_food_quantity
+        """
+        stats = pet_stats(pet, now)
+        with self._lock:
+            pending = self._pending.get(pet["user_id"]) or PendingInteraction()
+            return {
+                "happiness": min(100, max(0, stats["happiness"] + pending.happiness)),
+                "hunger": min(100, max(0, stats["hunger"] + pending.hunger)),
+                "food_quantity": max(0, stats["food_quantity"] + pending.food_quantity),
+                "special_food_quantity": max(0, stats["special_food_quantity"] + pending.special_food_quantity),
+            }
+
+    def _load_pet(self, user_id):
+        snapshot = self.state_cache.get(user_id)
+        return snapshot["pet"] if snapshot else None
+
+    def _record(self, pet, **changes):
+        pending = self._pending.setdefault(pet["user_id"], PendingInteraction())
+        for name, delta in changes.items():
+            setattr(pending, name, getattr(pending, name) + delta)
+
+        self._count += 1
+        if self._count >= self.max_pending:
+            with self._wakeup:
+                self._wakeup.notify()
+
+    def play(self, user_id, amount):
+        """ Buffers a play. Returns the projected stats, or None if the user has no pet. """
+        with self._lock:
+            pet = self._load_pet(user_id)
+            if not pet:
+                return None
+
+            state = self.project(pet)
+            happiness = min(100, state["happiness"] + amount)
+            # record what actually changed, so a pet already at 100 doesn't bank happiness
+            self._record(pet, happiness=happiness - state["happiness"])
+            state["happiness"] = happiness
+            return state
+
+    def feed(self, user_id, food_type):
+        """ Buffers a feed. Returns the projected stats, or None if the user has no pet. """
+        with self._lock:
+            pet = self._load_pet(user_id)
+            if not pet:
+                return None
+
+            state = self.project(pet)
+            food_used, special_used, hunger_gained = feed_changes(
+                food_type, state["food_quantity"], state["special_food_quantity"])
+            hunger = min(100, state["hunger"] + hunger_gained)
+            self._record(pet, hunger=hunger - state["hunger"],
+                         food_quantity=-food_used, special_food_quantity=-special_used)
+
+            state["hunger"] = hunger
+            state["food_quantity"] -= food_used
+            state["special_food_quantity"] -= special_used
+            return state
+
+    def flush(self):
+        """ Writes every waiting tally in one transaction. Returns how many pets were written. """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._count = 0
+            if not pending:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    written, rejected = self._write(pending)
+                    # the snapshots still have the old stored values, and the tallies are gone now
+                    mark_user_changed(*pending)
+                    db.session.commit()
+                self.feeds_written += written
+                self.feeds_rejected += rejected
+            except Exception:
+                logger.exception("Flushing pet interactions failed, keeping them for the next flush")
+                # put them back so the next flush tries again
+                for user_id, changes in pending.items():
+                    merged = self._pending.setdefault(user_id, PendingInteraction())
+                    for name, delta in vars(changes).items():
+                        setattr(merged, name, getattr(merged, name) + delta)
+                return 0
+
+            return len(pending)
+
+    def _write(self, pending):
+        """ Relative UPDATEs for the tallies, bounded in SQL with the decay left running, no reads. Not committed.
+
+            Returns:
+                Tuple -> (feeds written, feeds dropped because the pet didn't have the food any more)
+        """
+        pet = Pet.__table__.c
+        statement = Pet.changes_statement(
+            datetime.now(tz=pytz.utc),
+            happiness=bindparam('d_happiness'),
+            hunger=bindparam('d_hunger'),
+            food_quantity=bindparam('d_food_quantity'),
+            special_food_quantity=bindparam('d_special_food_quantity'),
+        ).where(pet.user_id == bindparam('owner_id'),
+                pet.food_quantity + bindparam('d_food_quantity') >= 0,
+                pet.special_food_quantity + bindparam('d_special_food_quantity') >= 0)
+
+        plays, feeds = [], []
+        for user_id, changes in pending.items():
+            row = {"owner_id": user_id, **{f"d_{name}": delta for name, delta in vars(changes).items()}}
+            (feeds if changes.food_quantity or changes.special_food_quantity else plays).append(row)
+
+        # plays don't touch food, so the guard always holds and they all go in one executemany
+        if plays:
+            db.session.execute(statement, plays)
+
+        # a tally with feeds has to be checked on its own to know whether its row still had the food
+        written = rejected = 0
+        for row in feeds:
+            fed = -(row["d_food_quantity"] + row["d_special_food_quantity"])
+            if db.session.execute(statement, row).rowcount:
+                written += fed
+                continue
+            rejected += fed
+            if row["d_happiness"]:
+                db.session.execute(statement, {**row, "d_hunger": 0, "d_food_quantity": 0, "d_special_food_quantity": 0})
+        return written, rejected
+
+    def metrics(self):
+        """ Prometheus lines for feeds written and dropped by this worker's flushes, added to /metrics. """
+        lines = []
+        for name, help_text in (
+            ('written', 'Buffered pet feeds written to the database.'),
+            ('rejected', 'Buffered pet feeds dropped because the pet had run out of that food by the flush.'),
+        ):
+            lines += [f'# HELP kinetiquest_pet_feeds_{name}_total {help_text}',
+                      f'# TYPE kinetiquest_pet_feeds_{name}_total counter',
+                      f'kinetiquest_pet_feeds_{name}_total {getattr(self, f"feeds_{name}")}']
+        return lines
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(timeout=self.flush_interval)
+                if self._stopping:
+                    return
+
+            self.flush()
@@ -0,0 +1,247 @@
+""" Server-Sent Events stream of a user's pet, food and quests.
+
+    A page opens one long-lived GET /api/events instead of re-fetching after
+    every action. The first event is the whole home state (the same shape as
+    /api/home_state). After that the stream only sends what changed:
+
+        event: pet        -> the pet fields that changed, e.g. {"happiness": 83}
+        event: inventory  -> the food counts that changed
+        event: quests     -> {"changed": [quests added or updated], "removed": [ids no longer active]}
+
+    Nothing is put on the wire by the write paths themselves. They only say
+    which users changed: commits through StateCache's invalidation listener,
+    buffered plays and feeds by calling publish() from the view. Each open
+    stream for that user is woken, works out the state again (usually a
+    cache hit) and sends the difference from what it sent last, so a burst
+    of writes coalesces into one event. Streams also wake on a heartbeat to
+    push happiness and hunger decaying, or a keepalive comment if nothing did.
+
+    Brokers carry the "user changed" notices between writers and streams:
+        memory  -> in process, the default. Fine with one worker.
+        sqlite  -> also through a SQLite file in the instance folder, which every worker on the host
+                   polls, so a write in one worker reaches streams held open by another. Notices
+                   from other workers drop the user's snapshot from this worker's state cache too.
+
+    Every open stream holds a server thread, so run a threaded server.
+"""
+from flask import Response
+from homestate import load_home_state
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryBroker:
+
+    def __init__(self):
+        self._subscribers = {}  # user id -> set of threading.Event
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """ Returns an Event that is set whenever the user changes. """
+        changed = threading.Event()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(changed)
+        return changed
+
+    def unsubscribe(self, user_id, changed):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(changed)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_ids):
+        self._notify(user_ids)
+
+    def _notify(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                for changed in self._subscribers.get(user_id, ()):
+                    changed.set()
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class SqliteBroker(MemoryBroker):
+    """ Notices are delivered in process straight away and also written to a shared SQLite file,
+        which a thread in every worker polls for the ones other workers wrote.
+    """
+
+    def __init__(self, path, poll_interval=0.5, retention=60, on_remote=None):
+        super().__init__()
+        self.path = path
+        # called with the user ids from other workers' notices, before the streams are woken
+        self.on_remote = on_remote
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._reader_pid = None
+        self._reader_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS notices "
+                               "(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                               "pid INTEGER NOT NULL, at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_notices_at ON notices (at)")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        return connection
+
+    def _connection(self):
+        # one connection per thread, and a fresh one after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def subscribe(self, user_id):
+        # the reader only runs in workers that have streams open, and threads don't survive a fork
+        with self._reader_lock:
+            if self._reader_pid != os.getpid():
+                self._reader_pid = os.getpid()
+                threading.Thread(target=self._read, name='live-updates-reader', daemon=True).start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_ids):
+        super().publish(user_ids)
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT INTO notices (user_id, pid, at) VALUES (?, ?, ?)",
+                                   [(user_id, os.getpid(), now) for user_id in user_ids])
+            connection.execute("DELETE FROM notices WHERE at < ?", (now - self.retention,))
+        finally:
+            connection.execute("COMMIT")
+
+    def _read(self):
+        connection = self._connect()
+        last_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM notices").fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            rows = connection.execute("SELECT id, user_id FROM notices WHERE id > ? AND pid != ?",
+                                      (last_id, os.getpid())).fetchall()
+            if rows:
+                last_id = rows[-1][0]
+                user_ids = {user_id for _, user_id in rows}
+                if self.on_remote:
+                    self.on_remote(user_ids)
+                self._notify(user_ids)
+
+
+def state_deltas(old, new):
+    """ (event name, data) for each part of the home state that differs between old and new. """
+    deltas = []
+    if new["pet"] != old["pet"]:
+        if new["pet"] is None or old["pet"] is None:
+            deltas.append(("pet", new["pet"]))
+        else:
+            deltas.append(("pet", {name: value for name, value in new["pet"].items() if old["pet"].get(name) != value}))
+
+    if new["inventory"] != old["inventory"]:
+        deltas.append(("inventory", {name: value for name, value in new["inventory"].items()
+                                     if old["inventory"].get(name) != value}))
+
+    old_quests = {quest["id"]: quest for quest in old["quests"]}
+    new_ids = {quest["id"] for quest in new["quests"]}
+    changed = [quest for quest in new["quests"] if old_quests.get(quest["id"]) != quest]
+    removed = [quest_id for quest_id in old_quests if quest_id not in new_ids]
+    if changed or removed:
+        deltas.append(("quests", {"changed": changed, "removed": removed}))
+    return deltas
+
+
+class LiveUpdates:
+
+    def __init__(self, app, state_cache, interactions, broker=None):
+        self.app = app
+        self.state_cache = state_cache
+        self.interactions = interactions
+        self.heartbeat = app.config.get('LIVE_UPDATES_HEARTBEAT', 15)
+        # streams end after this long and the browser reconnects, so workers can be restarted
+        self.max_seconds = app.config.get('LIVE_UPDATES_MAX_SECONDS', 600)
+
+        if broker is not None:
+            self.broker = broker
+        elif app.config.get('LIVE_UPDATES_BROKER', 'memory') == 'memory':
+            self.broker = MemoryBroker()
+        elif app.config['LIVE_UPDATES_BROKER'] == 'sqlite':
+            self.broker = SqliteBroker(app.config.get('LIVE_UPDATES_PATH')
+                                       or os.path.join(app.instance_path, 'live_updates.db'),
+                                       on_remote=lambda user_ids: state_cache.invalidate(*user_ids, notify=False))
+        else:
+            raise ValueError(f"Unknown LIVE_UPDATES_BROKER {app.config['LIVE_UPDATES_BROKER']!r}, "
+                             f"expected 'memory' or 'sqlite'")
+
+        self.events_sent = 0
+        self._lock = threading.Lock()
+        state_cache.add_listener(self.publish)
+
+    def publish(self, user_ids):
+        """ Wakes every stream open for these users. """
+        self.broker.publish(user_ids)
+
+    def _state(self, user_id):
+        # a fresh app context each time, so the stream doesn't keep a database connection checked out
+        with self.app.app_context():
+            return load_home_state(user_id, self.state_cache, self.interactions)
+
+    def _event(self, name, data, event_id):
+        with self._lock:
+            self.events_sent += 1
+        return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def stream(self, user_id):
+        """ The text/event-stream response for a user. """
+        def generate():
+            # subscribed before the first read, so a change in between isn't missed
+            changed = self.broker.subscribe(user_id)
+            try:
+                state = self._state(user_id)
+                if state is None:
+                    return
+                event_id = 1
+                yield "retry: 2000\n" + self._event('state', state, event_id)
+
+                deadline = time.monotonic() + self.max_seconds
+                while time.monotonic() < deadline:
+                    woken = changed.wait(self.heartbeat)
+                    changed.clear()
+
+                    new_state = self._state(user_id)
+                    if new_state is None:
+                        return
+                    deltas = state_deltas(state, new_state)
+                    state = new_state
+
+                    for name, data in deltas:
+                        event_id += 1
+                        yield self._event(name, data, event_id)
+                    if not deltas and not woken:
+                        yield ": keepalive\n\n"
+            finally:
+                self.broker.unsubscribe(user_id, changed)
+
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    def metrics(self):
+        """ Prometheus lines for open streams and events sent, added to /metrics. """
+        return [
+            '# HELP kinetiquest_live_update_streams Open /api/events streams in this worker.',
+            '# TYPE kinetiquest_live_update_streams gauge',
+            f'kinetiquest_live_update_streams {self.broker.connections()}',
+            '# HELP kinetiquest_live_update_events_total Events sent on /api/events streams.',
+            '# TYPE kinetiquest_live_update_events_total counter',
+            f'kinetiquest_live_update_events_total {self.events_sent}',
+        ]
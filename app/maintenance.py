@@ -0,0 +1,190 @@
+""" Nightly maintenance over every user, not just the ones who log in.
+
+    Rolls over all past-due quests (the rules of Quest.reset_due_date, through
+    rollover.rollover_quests) and settles every pet's decay into its stored
+    happiness and hunger (what logging in used to do), so someone back from
+    a break doesn't find weeks of stale state waiting to be worked out on
+    their first request.
+
+    Users are walked in id order, a chunk at a time with keyset paging, and
+    the chunks are handed to a pool of worker processes, each with its own
+    database connection. Each chunk commits on its own, so the app keeps
+    serving in between. The run writes a checkpoint to the instance
+    folder as chunks finish; an interrupted run picks up after the last user
+    whose chunk (and every chunk before it) completed, with the same "now",
+    and the file is removed once the run is done. Redoing a chunk is
+    harmless, nothing in it is past due any more.
+
+    Usage:
+        flask --app app/app.py nightly-maintenance [--chunk-size 500] [--workers 4] [--restart]
+"""
+from models import db, User, Pet, mark_user_changed
+from rollover import rollover_quests
+from sqlalchemy import select, func, or_
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import multiprocessing
+import json
+import os
+import pytz
+import time
+
+# the app the pool workers use, inherited when they are forked
+_app = None
+
+
+def user_id_chunks(after_id, chunk_size):
+    """ Yields lists of user ids in id order, chunk_size at a time, starting after after_id. """
+    while True:
+        ids = db.session.execute(
+            select(User.id).where(User.id > after_id).order_by(User.id).limit(chunk_size)
+        ).scalars().all()
+        # don't hold a read transaction open while the chunk is worked on
+        db.session.rollback()
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def settle_pets(user_ids, now):
+    """ Bakes the decay up to now into the users' pets with one UPDATE and commits.
+
+        Pets settled after now (played with since the run started) are left alone.
+
+        Returns:
+            Int -> number of pets settled
+    """
+    pet = Pet.__table__.c
+    settled = db.session.execute(
+        Pet.changes_statement(now, settle=True)
+        .where(pet.user_id.in_(user_ids), or_(pet.decay_from.is_(None), pet.decay_from < now))
+    ).rowcount
+    if settled:
+        mark_user_changed(*user_ids)
+    db.session.commit()
+    return settled
+
+
+def maintain_users(user_ids, now):
+    """ Rollover and pet settling for one chunk of users.
+
+        Returns:
+            Tuple -> (users, quests rolled over, pets settled)
+    """
+    return len(user_ids), rollover_quests(user_ids, now), settle_pets(user_ids, now)
+
+
+def _init_worker():
+    global _app
+    if _app is None:  # spawned rather than forked, so load it fresh
+        from app import app as _app
+    # the pool inherited from the parent holds the parent's connections, start this process's own
+    with _app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _run_chunk(user_ids, now):
+    with _app.app_context():
+        return maintain_users(user_ids, now)
+
+
+class Checkpoint:
+    """ Where an interrupted run got to, as JSON in a file. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """ Returns (now, after user id) of the unfinished run, or None. """
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        return datetime.fromisoformat(saved['now']), saved['after_id']
+
+    def save(self, now, after_id):
+        # written beside the old one and swapped in, so a kill mid-write can't leave half a file
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'now': now.isoformat(), 'after_id': after_id}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def run_maintenance(app, chunk_size=500, workers=4, checkpoint_path=None, restart=False, progress=None):
+    """ Runs the maintenance over every user, resuming an interrupted run unless restart is set.
+
+        progress, if given, is called after each chunk with a dict of the running totals.
+
+        Returns:
+            Dict -> users, quests_rolled, pets_settled, seconds, resumed_after (user id or None)
+    """
+    global _app
+    _app = app
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(app.instance_path, 'maintenance.json'))
+
+    saved = None if restart else checkpoint.load()
+    now, after_id = saved or (datetime.now(tz=pytz.utc), 0)
+
+    total = db.session.execute(select(func.count(User.id)).where(User.id > after_id)).scalar()
+    totals = {'users': 0, 'quests_rolled': 0, 'pets_settled': 0, 'total_users': total,
+              'resumed_after': after_id if saved else None}
+    started = time.monotonic()
+
+    def finished(chunk_result):
+        users, quests_rolled, pets_settled = chunk_result
+        totals['users'] += users
+        totals['quests_rolled'] += quests_rolled
+        totals['pets_settled'] += pets_settled
+        totals['seconds'] = time.monotonic() - started
+        if progress:
+            progress(dict(totals))
+
+    checkpoint.save(now, after_id)
+    chunks = user_id_chunks(after_id, chunk_size)
+
+    if workers <= 1:
+        for user_ids in chunks:
+            finished(maintain_users(user_ids, now))
+            checkpoint.save(now, user_ids[-1])
+    else:
+        # the workers are forked from here, so don't hand them a connection that's in use
+        db.session.remove()
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+            pending = {}  # future -> last user id of its chunk
+            done_up_to = []  # last user ids of submitted chunks, in order, until they're all finished
+            completed = set()
+
+            def collect(futures):
+                for future in futures:
+                    finished(future.result())
+                    completed.add(pending.pop(future))
+                # the checkpoint only moves past chunks that finished along with everything before them
+                watermark = None
+                while done_up_to and done_up_to[0] in completed:
+                    watermark = done_up_to.pop(0)
+                    completed.discard(watermark)
+                if watermark is not None:
+                    checkpoint.save(now, watermark)
+
+            for user_ids in chunks:
+                # a couple of chunks queued per worker keeps them busy without reading every id up front
+                while len(pending) >= workers * 2:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[pool.submit(_run_chunk, user_ids, now)] = user_ids[-1]
+                done_up_to.append(user_ids[-1])
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+
+    checkpoint.clear()
+    totals['seconds'] = time.monotonic() - started
+    return totals
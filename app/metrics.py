@@ -0,0 +1,215 @@
+""" Per-request profiling and a Prometheus /metrics endpoint.
+
+    For each sampled request we record how long it took, how many SQL
+    statements it ran and for how long, and how many commits it made, keyed
+    by method and route (the URL rule, not the raw path, so ids don't explode
+    the label set). Statements and commits are picked up from SQLAlchemy
+    engine events on the request's own thread, so background threads don't
+    count against whichever request happens to be running.
+
+    Requests slower than METRICS_SLOW_REQUEST_MS are logged with the
+    statements they ran. With METRICS_SAMPLE_RATE=0 neither the request hooks
+    nor the engine listeners are registered, so profiling costs nothing.
+
+    Other components add their own numbers with add_collector().
+
+    The numbers are per process: with several workers, scrape each one.
+
+    /metrics shows route latencies and the SQL of slow requests, so it's off
+    unless METRICS_ENDPOINT is set, and then only answers scrapes that send
+    "Authorization: Bearer <METRICS_TOKEN>". With it off the profiling still
+    runs for the slow request log.
+"""
+from flask import Response, request
+import hmac
+from sqlalchemy import event
+from models import db
+import random
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_LOG_STATEMENTS = 50
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{label_value(value)}"' for name, value in values.items()) + '}'
+
+
+class RouteStats:
+
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.commits = 0
+
+
+class RequestMetrics:
+
+    def __init__(self, app=None, sample_rate=1.0, slow_request_ms=500, buckets=DEFAULT_BUCKETS):
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+        self.buckets = buckets
+        self.token = None
+
+        self._routes = {}
+        self._statuses = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._current = threading.local()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('METRICS_SAMPLE_RATE', self.sample_rate)
+        self.slow_request_ms = app.config.get('METRICS_SLOW_REQUEST_MS', self.slow_request_ms)
+        self.logger = app.logger
+
+        if app.config.get('METRICS_ENDPOINT'):
+            self.token = app.config.get('METRICS_TOKEN')
+            if not self.token:
+                raise ValueError("METRICS_ENDPOINT needs METRICS_TOKEN set, /metrics is never served openly")
+            app.add_url_rule('/metrics', 'metrics', self.scrape)
+        if self.sample_rate <= 0:
+            return
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_statement)
+            event.listen(db.engine, 'after_cursor_execute', self._after_statement)
+            event.listen(db.engine, 'commit', self._commit)
+
+        app.before_request(self._start)
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+
+    def add_collector(self, collector):
+        """ collector() is called on every scrape and returns more lines in the Prometheus text format. """
+        self._collectors.append(collector)
+
+    # request hooks
+
+    def _start(self):
+        if request.endpoint == 'metrics' or random.random() >= self.sample_rate:
+            self._current.state = None
+            return
+        self._current.state = {
+            "start": time.perf_counter(),
+            "status": 500,  # replaced by _status unless the view raised
+            "statements": [],
+            "sql_seconds": 0.0,
+            "commits": 0,
+        }
+
+    def _status(self, response):
+        state = getattr(self._current, 'state', None)
+        if state:
+            state["status"] = response.status_code
+        return response
+
+    def _finish(self, exc):
+        state = getattr(self._current, 'state', None)
+        if not state:
+            return
+        self._current.state = None
+
+        seconds = time.perf_counter() - state["start"]
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.record(request.method, route, state["status"], seconds,
+                    len(state["statements"]), state["sql_seconds"], state["commits"])
+
+        if seconds * 1000 >= self.slow_request_ms:
+            statements = '\n'.join(f"  {millis:.1f}ms {sql}" for sql, millis in state["statements"][:SLOW_LOG_STATEMENTS])
+            self.logger.warning(f"Slow request {request.method} {request.path} took {seconds * 1000:.0f}ms, "
+                                f"{len(state['statements'])} statements, {state['commits']} commits:\n{statements}")
+
+    # engine events, on whatever thread runs the statement
+
+    def _before_statement(self, conn, cursor, statement, parameters, context, executemany):
+        state = getattr(self._current, 'state', None)
+        if state:
+            state["statement_start"] = time.perf_counter()
+
+    def _after_statement(self, conn, cursor, statement, parameters, context, executemany):
+        state = getattr(self._current, 'state', None)
+        if state and "statement_start" in state:
+            elapsed = time.perf_counter() - state.pop("statement_start")
+            state["sql_seconds"] += elapsed
+            state["statements"].append((' '.join(statement.split()), elapsed * 1000))
+
+    def _commit(self, conn):
+        state = getattr(self._current, 'state', None)
+        if state:
+            state["commits"] += 1
+
+    def record(self, method, route, status, seconds, statements, sql_seconds, commits):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats(self.buckets)
+
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats.bucket_counts[i] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            stats.statements += statements
+            stats.sql_seconds += sql_seconds
+            stats.commits += commits
+
+            key = (method, route, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+
+    def scrape(self):
+        """ The /metrics view, render() for a request with the bearer token. """
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), self.token.encode()):
+            return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+        return self.render()
+
+    def render(self):
+        """ Everything recorded so far in the Prometheus text format. """
+        with self._lock:
+            routes = sorted(self._routes.items())
+            statuses = sorted(self._statuses.items())
+
+            lines = [
+                '# HELP kinetiquest_requests_total Sampled requests by route and status.',
+                '# TYPE kinetiquest_requests_total counter',
+            ]
+            lines += [f'kinetiquest_requests_total{labels(method=method, route=route, status=status)} {count}'
+                      for (method, route, status), count in statuses]
+
+            lines += [
+                '# HELP kinetiquest_request_duration_seconds Time spent handling sampled requests.',
+                '# TYPE kinetiquest_request_duration_seconds histogram',
+            ]
+            for (method, route), stats in routes:
+                for bound, count in zip(self.buckets, stats.bucket_counts):
+                    lines.append(f'kinetiquest_request_duration_seconds_bucket'
+                                 f'{labels(method=method, route=route, le=bound)} {count}')
+                lines.append(f'kinetiquest_request_duration_seconds_bucket'
+                             f'{labels(method=method, route=route, le="+Inf")} {stats.count}')
+                lines.append(f'kinetiquest_request_duration_seconds_sum{labels(method=method, route=route)} {stats.seconds}')
+                lines.append(f'kinetiquest_request_duration_seconds_count{labels(method=method, route=route)} {stats.count}')
+
+            for name, help_text, attribute in (
+                ('kinetiquest_request_sql_statements_total', 'SQL statements run by sampled requests.', 'statements'),
+                ('kinetiquest_request_sql_seconds_total', 'Time sampled requests spent in SQL.', 'sql_seconds'),
+                ('kinetiquest_request_commits_total', 'Commits made by sampled requests.', 'commits'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{labels(method=method, route=route)} {getattr(stats, attribute)}'
+                          for (method, route), stats in routes]
+
+        for collector in self._collectors:
+            lines += collector()
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -1,12 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, update, select, insert, insert_sentinel, cast, Integer
 from datetime import datetime
 from datetime import timedelta
 import pytz
-from sqlalchemy.dialects.sqlite import JSON
+from sqlalchemy.dialects.sqlite import JSON, insert as sqlite_insert
 
 db = SQLAlchemy()
 
+# session.info key for the users a transaction has changed, their cached state is dropped on commit
+CHANGED_USERS = 'changed_user_ids'
+
+
+def mark_user_changed(*user_ids):
+    """ Records that the current transaction changes these users' pet, quests or score.
+
+        Changes made through ORM objects are noticed on flush, this is for UPDATE/INSERT statements.
+        See statecache.py.
+    """
+    db.session.info.setdefault(CHANGED_USERS, set()).update(user_id for user_id in user_ids if user_id is not None)
+
 
 
 class User(db.Model):
@@ -21,8 +33,15 @@ class User(db.Model):
     account_creation = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=pytz.utc))
     account_updated = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=pytz.utc), onupdate=lambda: datetime.now(tz=pytz.utc))
 
+    # sum of reward * streak over this user's quests, kept up to date by the quest write paths
+    streak_score = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # where the user is in onboarding: 'pet' -> 'quests' -> 'done'. New accounts start at 'pet',
+    # the server default is for accounts from before this was tracked
+    onboarding_stage = db.Column(db.String(10), nullable=False, default='pet', server_default='done')
+
     #Quests
-    quests = db.relationship('Quest', backref='assigned_user', lazy='joined')
+    quests = db.relationship('Quest', backref='assigned_user', lazy='select')
 
     #Pet, just one for now
     pet = db.relationship('Pet', back_populates='user', uselist=False)
@@ -39,48 +58,28 @@ class User(db.Model):
         self.role = role
 
     def determine_streak(self) -> int:
-        streak = 0
-        for quest in self.quests:
-            streak = streak + (quest.reward * quest.streak)
-        return streak
-
-    # call this once during each login
-    def update_pet_status_on_login(self):
-        # not pet confirmation but shouldn't be needed
-        if not self.pet:
-            return  
-
-        # Get the current time and the last login time
-        now = datetime.now(tz=pytz.utc)
-        last_login = self.account_updated
-
-        # timezones again
-        if last_login and last_login.tzinfo is None:
-            last_login = last_login.replace(tzinfo=pytz.utc)
-
-        # time difference in hours
-        time_diff = (now - last_login).total_seconds() / 3600 # seconds to hours
-        # print(time_diff)
-
+        return self.streak_score or 0
+
+    @staticmethod
+    def adjust_streak_score(user_id, delta):
+        # done in SQL so two requests touching the same user can't lose an update
+        if delta and user_id is not None:
+            Pet.settle_decay([user_id])
+            db.session.execute(
+                update(User).where(User.id == user_id)
+                .values(streak_score=User.streak_score + delta)
+                .execution_options(synchronize_session=False)
+            )
+            mark_user_changed(user_id)
+
+    # how many points per hour the pet loses, based on how well quests are going
+    def pet_decay_rates(self):
         # changes happiness and hunger decrease rate based on streaks of quests
         # currently super high for demonstration purposes
-        happiness_decrease = map_to_range(self.determine_streak(), 25, 500, 1500, 150) * time_diff
-        hunger_decrease = map_to_range(self.determine_streak(), 25, 500, 3000, 300) * time_diff
-
-        # print(self.pet.happiness)
-        self.pet.happiness = max(0, self.pet.happiness - int(happiness_decrease))
-        # print(self.pet.happiness)
-        # print(self.pet.hunger)
-        self.pet.hunger = max(0, self.pet.hunger - int(hunger_decrease))
-        # print(self.pet.hunger)
-
-        # now set acoount updated to now
-        self.account_updated = now
-        
-
-        db.session.commit()
-
-    
+        streak = self.determine_streak()
+        happiness_rate = map_to_range(streak, *HAPPINESS_DECAY)
+        hunger_rate = map_to_range(streak, *HUNGER_DECAY)
+        return happiness_rate, hunger_rate
 
     def save(self):
         db.session.add(self)
@@ -97,6 +96,14 @@ class User(db.Model):
 
 
 class Quest(db.Model):
+    # every page filters quests by owner, usually with a status or due date on top
+    __table_args__ = (
+        db.Index('ix_quest_assigned_to_status_end_time', 'assigned_to', 'status', 'end_time'),
+        db.Index('ix_quest_assigned_to_due_date', 'assigned_to', 'due_date'),
+        # the mask rides along so "due in this window on these days" is answered from the index
+        db.Index('ix_quest_due_date_repeat_mask', 'due_date', 'repeat_mask'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -112,27 +119,31 @@ class Quest(db.Model):
     end_time = db.Column(db.DateTime)
 
     due_date = db.Column(db.DateTime(timezone=True)) # date due
-    repeat_days = db.Column(JSON, default=[]) # format is like ['Monday', 'Tuesday'] I think but in a JSON column
+    # repeat days as a 7-bit mask, bit 0 is Monday like datetime.weekday(), so SQL can test a day with &
+    repeat_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     due_time = db.Column(db.Time)  # time due
     end_of_day = db.Column(db.Boolean, default=False) # for if we just want to default to end of day
 
+    # filled in per row by multi-row INSERTs so RETURNING can be matched back to VALUES, see run_batch.
+    # SQLite can't do that with the autoincrement id
+    _sentinel = insert_sentinel('_sentinel')
+
     def __repr__(self) -> str:
         return f"<Quest(id={self.id}, description={self.description}, assigned_to={self.assigned_to}, status={self.status})>"
 
 
     # helper to go from day to int for easy of use
     def day_to_int(self, day):
-        days_map = {
-            'Monday': 0,
-            'Tuesday': 1,
-            'Wednesday': 2,
-            'Thursday': 3,
-            'Friday': 4,
-            'Saturday': 5,
-            'Sunday': 6
-        }
-        return days_map.get(day, -1)
-    
+        return DAY_NUMBERS.get(day, -1)
+
+    # the mask as a list of weekday numbers, Monday is 0
+    @property
+    def repeat_days(self):
+        return mask_to_days(self.repeat_mask or 0)
+
+    @repeat_days.setter
+    def repeat_days(self, days):
+        self.repeat_mask = days_to_mask(days)
 
     def __init__(self, description, user_id, quest_type='daily', duration_hours=24, weight=5, due_date=None, repeat_days=None, due_time=None, end_of_day=True, repeat=False):
         self.description = description
@@ -148,9 +159,8 @@ class Quest(db.Model):
 
         # print("Added task type")
         # print(self.quest_type)
-        self.repeat_days = []
-        for day in repeat_days:
-            self.repeat_days.append(self.day_to_int(day))
+        repeat_days = repeat_days or []
+        self.repeat_mask = days_to_mask(repeat_days)
 
         if (len(repeat_days) == 7) and (self.quest_type == 'specific'):
             self.quest_type = 'daily'
@@ -159,7 +169,7 @@ class Quest(db.Model):
         elif (self.quest_type == 'specific') and (len(repeat_days) == 1):
             self.quest_type = 'weekly'
         elif (self.quest_type == 'weekly') and (len(repeat_days) == 0):
-            self.repeat_days = [datetime.now().weekday()]
+            self.repeat_mask = 1 << datetime.now().weekday()
 
         if self.quest_type == 'none':
             self.reward = 1
@@ -197,101 +207,122 @@ class Quest(db.Model):
 
     # untested
     def reset_due_date(self):
-        
-
         now = datetime.now(tz=pytz.utc)
-        due_date = self.due_date.replace(tzinfo=pytz.utc)
-        
-        # make sure due_date is timezone-aware
-        if due_date and due_date.tzinfo is None:
-            self.due_date = self.due_date.replace(tzinfo=pytz.utc)
-            
-
-        # when past due, we just reset due data to +1 day for daily
-        if self.quest_type == 'daily' and now > due_date:
-
-            end_of_due_day = due_date + timedelta(days=1)
-            if now < end_of_due_day:
-                self.streak = self.streak + 1
-            else:
-                self.streak = 0
-            
-            self.due_date = now + timedelta(days=1)
-            # remember to actually update status
-            self.status = 'uncompleted'
-            
-
-
-        elif self.quest_type == 'weekly' and now > due_date:
-            self.status = 'uncompleted'
-            
-            end_of_due_week = due_date + timedelta(days=7)
-            if now < end_of_due_week:
-                self.streak = self.streak + 1
-            else:
-                self.streak = 0
-
-            next_due_day = self.repeat_days[0]
-
-            days_until_next_due = (next_due_day - now.weekday()) % 7
-            if days_until_next_due == 0:
-                days_until_next_due = 7
-            self.due_date = now + timedelta(days=days_until_next_due)
-            
-
-        elif self.quest_type == 'specific' and now > due_date:
-            # remember to actually update status
-            self.status = 'uncompleted'
-
-            # convert days to ints
-            numeric_repeat_days = sorted(self.repeat_days)
-
-            if not numeric_repeat_days:
-                # should never get here
-                return
-
-            # Set next due date based on current weekday
-            # we default to next day being first day
-            next_due_day = self.repeat_days[0]
-
-            # but if can iterate through the repeaded day and get a later time, we do that
-            for day in self.repeat_days:
-                # now.weekday() should be int in same format as the helper function dict
-                if day > now.weekday():
-                    next_due_day=day
-                    # break bc we sorted
-                    break
-
-            days_until_next_due = (next_due_day - now.weekday()) % 7
-            if days_until_next_due == 0:
-                days_until_next_due = 7
-
-            end_of_due_time = due_date + timedelta(days=days_until_next_due)
-            if due_date < end_of_due_time:
-                self.streak = self.streak + 1
-            else:
-                self.streak = 0
-            self.due_date = now + timedelta(days=days_until_next_due)
-
-        if not self.repeat and now > due_date:
-            self.status = 'inactive'
-
-        # else:
-            # self.due_date = now + timedelta(days=1)
-
+        changes = rollover_changes(self.quest_type, self.repeat, self.repeat_mask,
+                                   self.due_date, self.streak, now)
+        if 'streak' in changes:
+            User.adjust_streak_score(self.assigned_to, self.reward * (changes['streak'] - (self.streak or 0)))
+        for column, value in changes.items():
+            setattr(self, column, value)
 
         db.session.commit()
 
+    # what this quest adds to its user's streak_score
+    def streak_value(self) -> int:
+        return (self.reward or 0) * (self.streak or 0)
 
     def save(self):
+        if self.id is None:
+            User.adjust_streak_score(self.assigned_to, self.streak_value())
         db.session.add(self)
         db.session.commit()
 
     def delete(self):
+        User.adjust_streak_score(self.assigned_to, -self.streak_value())
         db.session.delete(self)
         db.session.commit()
 
+class QuestTemplate(db.Model):
+    """ A preset quest offered during onboarding, copied into a Quest when picked. """
+    id = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    quest_type = db.Column(db.String(10), nullable=False)
+    reward = db.Column(db.Integer, nullable=False, default=0)
+    repeat_days = db.Column(JSON, default=[]) # ints like Quest.repeat_days
+    end_of_day = db.Column(db.Boolean, default=True)
+    repeat = db.Column(db.Boolean, default=False)
+
+    def __repr__(self) -> str:
+        return f"<QuestTemplate(id={self.id}, description={self.description}, quest_type={self.quest_type})>"
+
+    def __init__(self, description, quest_type='daily', reward=5, repeat_days=None, end_of_day=True, repeat=False):
+        self.description = description
+        self.quest_type = quest_type
+        self.reward = reward
+        self.repeat_days = repeat_days or []
+        self.end_of_day = end_of_day
+        self.repeat = repeat
+
+
+class QuestCompletion(db.Model):
+    """ One row each time a quest is completed. Rows are only ever added, so a repeating quest keeps its whole
+        history after rollover resets its status, and it outlives the quest being deleted (hence no foreign key).
+    """
+    __table_args__ = (
+        # history pages are keyset paged on (completed_at, id) per user
+        db.Index('ix_quest_completion_user_id_completed_at', 'user_id', 'completed_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quest_id = db.Column(db.Integer, nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    quest_type = db.Column(db.String(10), nullable=False)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    @staticmethod
+    def record(user_id, quests, now):
+        """ Logs completions and adds them to the user's DailyCompletion row for the day, in the current
+            transaction, so the log and the quests' status can't disagree. Not committed.
+
+            quests is (quest id, description, quest type) for each completion.
+        """
+        if not quests:
+            return
+
+        db.session.execute(insert(QuestCompletion), [
+            {"user_id": user_id, "quest_id": quest_id, "description": description, "quest_type": quest_type,
+             "completed_at": now}
+            for quest_id, description, quest_type in quests
+        ])
+
+        special = sum(1 for _, _, quest_type in quests if quest_type in SPECIAL_FOOD_QUEST_TYPES)
+        DailyCompletion.add(user_id, now.astimezone(pytz.utc).date(), len(quests), special)
+
+
+# quest types whose completion earns special food, the rest earn the regular kind
+SPECIAL_FOOD_QUEST_TYPES = ('weekly', 'specific')
+
+
+class DailyCompletion(db.Model):
+    """ Completions per user per UTC day, kept up to date as QuestCompletion rows are added, so history and
+        stats charts read a row a day instead of every completion.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    # completions of weekly and specific quests, the ones that earn special food
+    special_completions = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def add(user_id, day, completions, special_completions=0):
+        """ Adds to the user's row for the day, creating it if needed, in one upsert. Not committed. """
+        table = DailyCompletion.__table__
+        statement = sqlite_insert(table).values(user_id=user_id, day=day, completions=completions,
+                                                special_completions=special_completions)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day],
+            set_={"completions": table.c.completions + statement.excluded.completions,
+                  "special_completions": table.c.special_completions + statement.excluded.special_completions},
+        ))
+
+
 class Pet(db.Model):
+    # one pet per user, and every pet lookup is by user
+    __table_args__ = (
+        db.Index('uq_pet_user_id', 'user_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     pet_type = db.Column(db.String(50), nullable=False)
     name = db.Column(db.String(50), nullable=False, default="Spot")
@@ -305,6 +336,10 @@ class Pet(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=pytz.utc))
     updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=pytz.utc), onupdate=lambda: datetime.now(tz=pytz.utc))
 
+    # happiness and hunger are stored as of this time and decay from there when read
+    decay_from = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=pytz.utc),
+                           server_default=db.func.current_timestamp())
+
     # user = db.relationship('User', backref='pet', uselist=False)
 
     def __repr__(self):
@@ -319,22 +354,109 @@ class Pet(db.Model):
         self.happiness = happiness
         self.food_quantity = food_quantity
         self.special_food_quantity = special_food_quantity
-
-    def feed(self, food_type):
-        # increase hunger (max 0)
-        # counter intuitive but looks better if not hungry is full bar
-        if food_type == 'food' and self.food_quantity > 0:
-            self.food_quantity -= 1
-            self.hunger = min(100, self.hunger + 10)
-        elif food_type == 'special' and self.special_food_quantity > 0:
-            self.special_food_quantity -= 1
-            self.hunger = min(100, self.hunger + 20)
-
-        self.update()
-
-    def play(self, amount):
-        self.happiness = min(100, self.happiness + amount)
-        self.update()
+        self.decay_from = datetime.now(tz=pytz.utc)
+
+    @staticmethod
+    def decay_points_sql(now):
+        """ SQL for how many whole points happiness and hunger have decayed by between decay_from and now.
+
+            SQLite only keeps times to the millisecond, so right on a boundary this can be a point apart
+            from what homestate.pet_stats works out in Python.
+
+            Returns:
+                Tuple -> (happiness expression, hunger expression) over the pet table
+        """
+        pet = Pet.__table__.c
+        user = User.__table__.c
+
+        streak = select(func.coalesce(user.streak_score, 0)).where(user.id == pet.user_id).scalar_subquery()
+        account_updated = select(user.account_updated).where(user.id == pet.user_id).scalar_subquery()
+        last_settled = func.coalesce(pet.decay_from, account_updated)
+        hours = func.max(0, (func.julianday(now) - func.julianday(last_settled)) * 24)
+
+        return (cast(map_to_range_sql(streak, *HAPPINESS_DECAY) * hours, Integer),
+                cast(map_to_range_sql(streak, *HUNGER_DECAY) * hours, Integer))
+
+    @staticmethod
+    def settled_stats_sql(now):
+        """ SQL for happiness and hunger settled up to now, the same sums homestate.pet_stats does in Python.
+
+            Returns:
+                Tuple -> (happiness expression, hunger expression) over the pet table
+        """
+        pet = Pet.__table__.c
+        happiness_points, hunger_points = Pet.decay_points_sql(now)
+        return (func.min(100, func.max(0, pet.happiness - happiness_points)),
+                func.min(100, func.max(0, pet.hunger - hunger_points)))
+
+    @staticmethod
+    def changes_statement(now, happiness=0, hunger=0, food_quantity=0, special_food_quantity=0, settle=False):
+        """ UPDATE for pet stat and food changes with the bounds enforced in SQL, for the caller to add a WHERE to.
+
+            Changes can be ints or bindparams (for executemany). Happiness and hunger end up within 0-100 once
+            decayed, and food never goes below 0.
+
+            The stat changes are made to the stored values with the decay so far left in them: the stored value
+            is shifted by the change and bounded to the range that decays to 0-100 right now, and decay_from
+            stays put. Baking the decay in instead would drop the part of a point that hadn't decayed yet on
+            every write, so a pet that's played with often would hardly decay at all. With settle the decay is
+            baked in anyway and decay_from moved to now, for the nightly maintenance.
+        """
+        pet = Pet.__table__.c
+        values = {
+            "food_quantity": func.max(0, pet.food_quantity + food_quantity),
+            "special_food_quantity": func.max(0, pet.special_food_quantity + special_food_quantity),
+            "updated_at": now,
+        }
+        if settle:
+            settled_happiness, settled_hunger = Pet.settled_stats_sql(now)
+            values["happiness"] = func.min(100, func.max(0, settled_happiness + happiness))
+            values["hunger"] = func.min(100, func.max(0, settled_hunger + hunger))
+            values["decay_from"] = now
+        else:
+            for name, change, points in zip(("happiness", "hunger"), (happiness, hunger), Pet.decay_points_sql(now)):
+                if isinstance(change, int) and not change:
+                    continue
+                # stored - points is what it has decayed to, so [points, 100 + points] decays to [0, 100]
+                values[name] = func.max(points, func.min(100 + points, func.max(pet[name], points) + change))
+
+        return update(Pet.__table__).values(**values)
+
+    @staticmethod
+    def settle_decay(user_ids, now=None):
+        """ Bakes the decay so far into the users' pets and restarts it from now. Not committed.
+
+            Decay is worked out over the whole time since decay_from at the rate the streak score gives now,
+            so this has to run before the score changes, or the new rate would be applied to hours that
+            already decayed at the old one.
+        """
+        now = now or datetime.now(tz=pytz.utc)
+        db.session.execute(Pet.changes_statement(now, settle=True).where(Pet.__table__.c.user_id.in_(user_ids)))
+
+    @staticmethod
+    def apply_changes(user_id, happiness=0, hunger=0, food_quantity=0, special_food_quantity=0, now=None, require=None):
+        """ Changes a user's pet stats and food in one UPDATE ... RETURNING, so concurrent requests can't lose
+            an increment and nothing needs reading first. Not committed.
+
+            require is an extra condition for the row, e.g. that there's food left to use up.
+
+            Returns:
+                Dict -> the new food_quantity and special_food_quantity, or None if no row matched
+        """
+        now = now or datetime.now(tz=pytz.utc)
+        pet = Pet.__table__.c
+
+        statement = Pet.changes_statement(now, happiness, hunger, food_quantity, special_food_quantity
+                                          ).where(pet.user_id == user_id)
+        if require is not None:
+            statement = statement.where(require)
+
+        # the stored stats still have the decay in them, homestate.pet_stats works out what they show
+        row = db.session.execute(
+            statement.returning(pet.food_quantity, pet.special_food_quantity)
+        ).one_or_none()
+        mark_user_changed(user_id)
+        return dict(row._mapping) if row else None
 
     def save(self):
         db.session.add(self)
@@ -359,4 +481,134 @@ def map_to_range(value, from_min, from_max, to_min, to_max):
         value = from_min
     
     # Linear mapping formula
-    return int(to_min + (value - from_min) * (to_max - to_min) / (from_max - from_min))
\ No newline at end of file
+    return int(to_min + (value - from_min) * (to_max - to_min) / (from_max - from_min))
+
+
+def decayed_stats(happiness, hunger, last_settled, decay_rates, now):
+    """ Happiness and hunger stored as of last_settled, decayed up to now at decay_rates points per hour.
+
+        Returns:
+            Tuple -> (happiness, hunger)
+    """
+    if last_settled.tzinfo is None:
+        last_settled = last_settled.replace(tzinfo=pytz.utc)
+
+    # time difference in hours
+    time_diff = max(0, (now - last_settled).total_seconds() / 3600)
+
+    happiness_rate, hunger_rate = decay_rates
+    # stored values can be over 100 with decay still to come off them, see Pet.changes_statement
+    return (min(100, max(0, happiness - int(happiness_rate * time_diff))),
+            min(100, max(0, hunger - int(hunger_rate * time_diff))))
+
+
+def map_to_range_sql(value, from_min, from_max, to_min, to_max):
+    """ map_to_range as a SQL expression, clamped and truncated the same way. """
+    value = func.min(from_max, func.max(from_min, value))
+    return cast(to_min + (value - from_min) * float(to_max - to_min) / (from_max - from_min), Integer)
+
+
+# (streak low, streak high, rate at low, rate at high) for pet_decay_rates
+HAPPINESS_DECAY = (25, 500, 1500, 150)
+HUNGER_DECAY = (25, 500, 3000, 300)
+
+
+def feed_changes(food_type, food_quantity, special_food_quantity):
+    """ What feeding a pet uses up and how much hunger it restores, nothing if that food has run out.
+
+        Returns:
+            Tuple -> (food used, special food used, hunger gained)
+    """
+    if food_type == 'food' and food_quantity > 0:
+        return 1, 0, 10
+    if food_type == 'special' and special_food_quantity > 0:
+        return 0, 1, 20
+    return 0, 0, 0
+
+
+# weekday names as the task form sends them, in datetime.weekday() order
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+DAY_NUMBERS = {name: number for number, name in enumerate(WEEKDAYS)}
+EVERY_DAY_MASK = 0b1111111
+
+
+def days_to_mask(days):
+    """ Repeat days, as weekday numbers or names, to a Quest.repeat_mask. Unknown days are left out. """
+    mask = 0
+    for day in days:
+        number = DAY_NUMBERS.get(day, -1) if isinstance(day, str) else day
+        if 0 <= number < 7:
+            mask |= 1 << number
+    return mask
+
+
+def mask_to_days(mask):
+    return [day for day in range(7) if mask & (1 << day)]
+
+
+def _days_until_next(weekday, mask):
+    for days in range(1, 8):
+        if mask & (1 << (weekday + days) % 7):
+            return days
+    return 0
+
+
+# NEXT_DUE_DAYS[weekday][mask] is how many days after weekday the next repeat day in mask is: 1-7, where 7
+# means only weekday itself is set, or 0 for no days. Rollovers look it up instead of scanning the days
+NEXT_DUE_DAYS = tuple(tuple(_days_until_next(weekday, mask) for mask in range(EVERY_DAY_MASK + 1))
+                      for weekday in range(7))
+
+
+def rollover_changes(quest_type, repeat, repeat_mask, due_date, streak, now):
+    """ Works out what a quest rollover should change, without touching the session.
+
+        Shared by Quest.reset_due_date and the bulk rollover in rollover.py so
+        both always agree on the rules.
+
+        Returns:
+            Dict -> column name to new value, empty when the quest is not past due
+    """
+    due_date = due_date.replace(tzinfo=pytz.utc)
+    changes = {}
+
+    # nothing rolls over until the due date has passed
+    if not now > due_date:
+        return changes
+
+    # when past due, we just reset due data to +1 day for daily
+    if quest_type == 'daily':
+        end_of_due_day = due_date + timedelta(days=1)
+        changes['streak'] = streak + 1 if now < end_of_due_day else 0
+        changes['due_date'] = now + timedelta(days=1)
+        # remember to actually update status
+        changes['status'] = 'uncompleted'
+
+    elif quest_type == 'weekly':
+        changes['status'] = 'uncompleted'
+
+        end_of_due_week = due_date + timedelta(days=7)
+        changes['streak'] = streak + 1 if now < end_of_due_week else 0
+
+        # on its first repeat day (the lowest bit), a whole week away if that's today
+        days_until_next_due = NEXT_DUE_DAYS[now.weekday()][repeat_mask & -repeat_mask] or 7
+        changes['due_date'] = now + timedelta(days=days_until_next_due)
+
+    elif quest_type == 'specific':
+        # remember to actually update status
+        changes['status'] = 'uncompleted'
+
+        if not repeat_mask:
+            # should never get here
+            return changes
+
+        # Set next due date based on current weekday: the next repeat day after today, wrapping round the week
+        days_until_next_due = NEXT_DUE_DAYS[now.weekday()][repeat_mask]
+
+        end_of_due_time = due_date + timedelta(days=days_until_next_due)
+        changes['streak'] = streak + 1 if due_date < end_of_due_time else 0
+        changes['due_date'] = now + timedelta(days=days_until_next_due)
+
+    if not repeat:
+        changes['status'] = 'inactive'
+
+    return changes
@@ -0,0 +1,166 @@
+""" Password hashing.
+
+    Hashes are stored as "<scheme>$<params>$<salt>$<hash>" so the scheme and
+    its cost travel with every hash, and the cost can be raised later without
+    breaking existing accounts. Bare 64 character hex digests are the old
+    unsalted sha256 hashes; they still verify, and login swaps them for the
+    current scheme (see PasswordHasher.needs_rehash).
+
+    The KDF runs in a small, bounded thread pool, and hashlib releases the GIL
+    while it works, so only max_workers hashes burn CPU at once however many
+    logins arrive together. The request thread still waits for its result.
+    What the bound buys is that a burst can't pile up without limit: past
+    max_pending queued or running jobs, or once a job has waited longer than
+    timeout, we give up with PasswordHasherBusy and the route answers 503.
+    A job counts against max_pending until it has actually finished, even if
+    the request that queued it has already given up on it.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from hashlib import sha256
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import re
+import threading
+
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def b64encode(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def b64decode(data):
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+class Pbkdf2Sha256:
+    name = 'pbkdf2_sha256'
+
+    def __init__(self, iterations=600000):
+        self.iterations = iterations
+
+    def hash(self, password, salt=None):
+        salt = salt or os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self.iterations)
+        return f"{self.name}${self.iterations}${b64encode(salt)}${b64encode(digest)}"
+
+    def verify(self, password, encoded):
+        _, iterations, salt, digest = encoded.split('$')
+        expected = hashlib.pbkdf2_hmac('sha256', password.encode(), b64decode(salt), int(iterations))
+        return hmac.compare_digest(expected, b64decode(digest))
+
+    def needs_rehash(self, encoded):
+        return int(encoded.split('$')[1]) != self.iterations
+
+
+class Scrypt:
+    name = 'scrypt'
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        self.n, self.r, self.p = n, r, p
+
+    def _derive(self, password, salt, n, r, p):
+        # OpenSSL's default 32MB cap is too low for n >= 2**15
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=32)
+
+    def hash(self, password, salt=None):
+        salt = salt or os.urandom(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.name}${self.n},{self.r},{self.p}${b64encode(salt)}${b64encode(digest)}"
+
+    def verify(self, password, encoded):
+        _, params, salt, digest = encoded.split('$')
+        n, r, p = (int(value) for value in params.split(','))
+        return hmac.compare_digest(self._derive(password, b64decode(salt), n, r, p), b64decode(digest))
+
+    def needs_rehash(self, encoded):
+        return encoded.split('$')[1] != f"{self.n},{self.r},{self.p}"
+
+
+SCHEMES = {scheme.name: scheme for scheme in (Pbkdf2Sha256, Scrypt)}
+
+
+def make_scheme(name, cost=None):
+    """ Scheme by name, with its cost (iterations for pbkdf2_sha256, n for scrypt) if given. """
+    if name not in SCHEMES:
+        raise ValueError(f"Unknown password hashing scheme {name!r}")
+    return SCHEMES[name](cost) if cost else SCHEMES[name]()
+
+
+class PasswordHasher:
+
+    def __init__(self, scheme=None, max_workers=2, max_pending=64, timeout=30):
+        self.scheme = scheme or Pbkdf2Sha256()
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self._pending = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(make_scheme(config.get('PASSWORD_HASH_SCHEME', 'pbkdf2_sha256'), config.get('PASSWORD_HASH_COST')),
+                   max_workers=config.get('PASSWORD_HASH_WORKERS', 2),
+                   max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 64))
+
+    def _pool(self):
+        # pool threads don't survive a fork, so each worker process makes its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='password-hasher')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._pending.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        # released when the job is done, not when we stop waiting, so abandoned jobs still count
+        future.add_done_callback(lambda _: self._pending.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy()
+
+    def _verify(self, password, encoded):
+        if not encoded:
+            return False
+        if LEGACY_SHA256.match(encoded):
+            return hmac.compare_digest(sha256(password.encode()).hexdigest(), encoded)
+
+        name = encoded.split('$', 1)[0]
+        if name not in SCHEMES:
+            return False
+        scheme = self.scheme if name == self.scheme.name else SCHEMES[name]()
+        try:
+            return scheme.verify(password, encoded)
+        except (ValueError, TypeError, binascii.Error):
+            # a truncated or hand-edited hash is a failed login, not a server error
+            return False
+
+    def hash(self, password):
+        return self._run(self.scheme.hash, password)
+
+    def verify(self, password, encoded):
+        """ Checks a password against a stored hash of any known scheme, including legacy sha256. """
+        return self._run(self._verify, password, encoded)
+
+    def needs_rehash(self, encoded):
+        """ True if the hash isn't the current scheme at the current cost. """
+        if not encoded.startswith(self.scheme.name + '$'):
+            return True
+        return self.scheme.needs_rehash(encoded)
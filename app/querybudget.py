@@ -0,0 +1,91 @@
+""" Query budgets, to catch extra round trips and N+1 patterns in development.
+
+    query_budget() works as a context manager around any block, or as a
+    decorator on a view. Inside it every SQL statement the current thread
+    runs is counted, and leaving the block raises QueryBudgetExceeded, with
+    the statements listed, if there were more than max_statements or the
+    same statement ran more than max_repeats times (the usual sign of a lazy
+    load in a loop).
+
+    On views the check only runs when the app has ENFORCE_QUERY_BUDGETS set,
+    so in production the decorator is one config lookup. Every route in
+    app.py declares a budget; tests/test_query_budgets.py exercises them all and
+    fails if any route is over or has no budget.
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+import functools
+import threading
+
+_active = threading.local()
+_listening = False
+_listening_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in getattr(_active, 'budgets', ()):
+        budget.statements.append(' '.join(statement.split()))
+
+
+def _listen():
+    # registered on first use, so nothing is listening unless budgets are in play
+    global _listening
+    with _listening_lock:
+        if not _listening:
+            event.listen(Engine, 'before_cursor_execute', _count_statement)
+            _listening = True
+
+
+class query_budget:
+
+    def __init__(self, max_statements, max_repeats=2, name=None):
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        self.name = name
+        self.statements = []
+
+    def __enter__(self):
+        _listen()
+        self.statements = []
+        if not hasattr(_active, 'budgets'):
+            _active.budgets = []
+        _active.budgets.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _active.budgets.remove(self)
+        if exc_type is None:
+            self.check()
+        return False
+
+    def problems(self):
+        found = []
+        if len(self.statements) > self.max_statements:
+            found.append(f"ran {len(self.statements)} statements, budget is {self.max_statements}")
+        for statement, count in Counter(self.statements).items():
+            if count > self.max_repeats:
+                found.append(f"ran the same statement {count} times (N+1?): {statement}")
+        return found
+
+    def check(self):
+        problems = self.problems()
+        if problems:
+            listing = '\n'.join(f"  {i}. {statement}" for i, statement in enumerate(self.statements, 1))
+            raise QueryBudgetExceeded(f"{self.name or 'block'} " + '; '.join(problems) + f"\nStatements:\n{listing}")
+
+    def __call__(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('ENFORCE_QUERY_BUDGETS'):
+                return view(*args, **kwargs)
+            with query_budget(self.max_statements, self.max_repeats, name=view.__name__):
+                return view(*args, **kwargs)
+
+        wrapper.query_budget = self
+        return wrapper
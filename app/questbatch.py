@@ -0,0 +1,164 @@
+""" Quest operations sent together, run in one transaction.
+
+    /api/batch takes an ordered list of the operations the single quest
+    endpoints do (add, update, delete, complete) so ticking off several
+    quests is one round trip and one commit instead of one each. The quests
+    the operations name are loaded with a single query, completions are
+    claimed with a single UPDATE (so, like /api/complete_task, only a request
+    that actually flips a quest's status earns its food), logged to the
+    completion history together and all the food is handed out with one pet
+    update.
+"""
+from models import db, User, Quest, Pet, QuestCompletion, mark_user_changed
+from sqlalchemy import select, update, insert
+from datetime import datetime
+import pytz
+
+MAX_OPERATIONS = 100
+
+# which food a completed quest earns, same as /api/complete_task
+FOOD_FOR_QUEST_TYPE = {
+    'daily': 'food_quantity',
+    'none': 'food_quantity',
+    'weekly': 'special_food_quantity',
+    'specific': 'special_food_quantity',
+}
+
+
+def new_quest(user_id, description, task_type='daily', due_date=None, due_time=None, repeat_days=(),
+              end_of_day=False, timezone=None):
+    """ A Quest from the fields /api/add_task takes, not yet added to the session.
+
+        Raises:
+            ValueError -> a field is missing or can't be parsed
+    """
+    if not description or not task_type or not user_id:
+        raise ValueError("Missing field in POST!")
+
+    try:
+        local_timezone = pytz.timezone(timezone)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError("Invalid timezone!")
+
+    # convert format of data and time
+    if due_date:
+        due_date = datetime.strptime(due_date, '%Y-%m-%d').replace(tzinfo=local_timezone)
+    if due_time:
+        due_time = datetime.strptime(due_time, '%H:%M').time()
+
+    return Quest(description=description, user_id=user_id, quest_type=task_type, due_date=due_date,
+                 repeat_days=list(repeat_days), due_time=due_time, end_of_day=end_of_day,
+                 repeat=task_type != 'none')
+
+
+def _task_id(operation):
+    try:
+        return int(operation.get('task_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def run_batch(user_id, operations, now=None):
+    """ Runs a user's quest operations in order and commits them together.
+
+        Each operation is a dict with "op" ('add', 'update', 'delete' or 'complete') and the fields the
+        matching single endpoint takes. One that can't run (a missing field, a quest that isn't the
+        user's, one deleted earlier in the batch) gets an error result and the rest carry on.
+
+        Returns:
+            Tuple -> (one result dict per operation, the pet's new stats if food was earned or None,
+                      due dates of the added quests for the scheduler)
+        Raises:
+            LookupError -> quests were completed but the user has no pet, nothing is committed
+    """
+    now = now or datetime.now(tz=pytz.utc)
+
+    task_ids = {_task_id(operation) for operation in operations} - {None}
+    quests = {}
+    if task_ids:
+        quests = {quest.id: quest for quest in db.session.execute(
+            select(Quest).where(Quest.assigned_to == user_id, Quest.id.in_(task_ids))
+        ).scalars()}
+
+    results = []
+    added = []  # (index in results, quest)
+    completing = {}  # quest id -> description, as it was when completed
+    streak_delta = 0
+
+    for operation in operations:
+        kind = operation.get('op')
+        try:
+            if kind == 'add':
+                quest = new_quest(user_id, operation.get('task_description'), operation.get('task_type', 'daily'),
+                                  operation.get('due_date'), operation.get('due_time'),
+                                  operation.get('repeat_days') or [], bool(operation.get('end_of_day')),
+                                  operation.get('timezone'))
+                added.append((len(results), quest))
+                results.append({"success": "Task added successfully!"})
+                continue
+
+            if kind not in ('update', 'delete', 'complete'):
+                raise ValueError(f"Unknown operation {kind!r}!")
+
+            quest = quests.get(_task_id(operation))
+            if quest is None:
+                results.append({"error": "Task not found!", "status": 404})
+                continue
+
+            if kind == 'update':
+                if not operation.get('new_description'):
+                    raise ValueError("Missing field in POST!")
+                quest.description = operation['new_description']
+                results.append({"success": "Task updated successfully!"})
+            elif kind == 'delete':
+                streak_delta -= quest.streak_value()
+                db.session.delete(quest)
+                del quests[quest.id]
+                results.append({"success": "Task marked as deleted."})
+            else:
+                completing.setdefault(quest.id, quest.description)
+                results.append({"success": "Task marked as completed!", "task_type": quest.quest_type})
+        except ValueError as e:
+            results.append({"error": str(e), "status": 400})
+
+    pet_state = None
+    if completing:
+        # claimed before the deletes are flushed, so complete-then-delete in one batch still earns the food
+        quest_table = Quest.__table__
+        with db.session.no_autoflush:
+            claimed = db.session.execute(
+                update(quest_table)
+                .where(quest_table.c.id.in_(list(completing)), quest_table.c.status != 'completed')
+                .values(status='completed', end_time=now)
+                .returning(quest_table.c.id, quest_table.c.quest_type)
+            ).all()
+        mark_user_changed(user_id)
+        QuestCompletion.record(user_id, [(quest_id, completing[quest_id], quest_type)
+                                         for quest_id, quest_type in claimed], now)
+
+        food = {}
+        for _, quest_type in claimed:
+            column = FOOD_FOR_QUEST_TYPE.get(quest_type)
+            if column:
+                food[column] = food.get(column, 0) + 1
+        if food:
+            pet_state = Pet.apply_changes(user_id, now=now, **food)
+            if pet_state is None:
+                raise LookupError("Pet not found!")
+
+    User.adjust_streak_score(user_id, streak_delta)
+
+    if added:
+        # one multi-row INSERT, as adding the objects would insert them a row at a time to get each id.
+        # RETURNING doesn't promise any order, sort_by_parameter_order has the ids come back in ours
+        ids = db.session.execute(insert(Quest).returning(Quest.id, sort_by_parameter_order=True), [
+            {key: value for key, value in vars(quest).items() if not key.startswith('_')}
+            for _, quest in added
+        ]).scalars().all()
+        for (index, _), quest_id in zip(added, ids):
+            results[index]["task_id"] = quest_id
+        mark_user_changed(user_id)
+    due_dates = [quest.due_date for _, quest in added]
+
+    db.session.commit()
+    return results, pet_state, due_dates
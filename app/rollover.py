@@ -0,0 +1,101 @@
+from models import db, User, Pet, Quest, rollover_changes, mark_user_changed
+from sqlalchemy import select, update, func, bindparam, and_, or_
+from datetime import datetime
+import pytz
+
+
+def rollover_due(now):
+    """ Quests a rollover at now has something to do for: past due, and not a one-off that's already been
+        made inactive, as those stay past due forever.
+    """
+    return and_(Quest.due_date < now, or_(Quest.status != 'inactive', Quest.repeat.is_(True)))
+
+
+def rollover_quests(user_ids, now=None):
+    """ Rolls over every past-due quest for a batch of users in one pass and one commit.
+
+        Only the overdue rows are read (just the columns the rollover needs),
+        the new values are worked out with the same rules as Quest.reset_due_date,
+        and everything is written back as a single executemany UPDATE.
+
+        Returns:
+            Int -> number of quests that were rolled over
+    """
+    now = now or datetime.now(tz=pytz.utc)
+
+    overdue = db.session.execute(
+        select(Quest.id, Quest.assigned_to, Quest.quest_type, Quest.repeat, Quest.repeat_mask,
+               Quest.due_date, Quest.streak, Quest.reward, Quest.status)
+        .where(Quest.assigned_to.in_(user_ids), rollover_due(now))
+    ).all()
+
+    rows = []
+    streak_deltas = {}
+    for quest in overdue:
+        changes = rollover_changes(quest.quest_type, quest.repeat, quest.repeat_mask,
+                                   quest.due_date, quest.streak, now)
+        # nothing to write when only the status comes back and it's already that
+        if changes and changes != {'status': quest.status}:
+            if 'streak' in changes:
+                delta = quest.reward * (changes['streak'] - (quest.streak or 0))
+                streak_deltas[quest.assigned_to] = streak_deltas.get(quest.assigned_to, 0) + delta
+            changes['id'] = quest.id
+            rows.append(changes)
+
+    if not rows:
+        return 0
+
+    # executemany wants the same keys on every row, so group by the columns touched
+    batches = {}
+    for row in rows:
+        batches.setdefault(tuple(sorted(row)), []).append(row)
+
+    for batch in batches.values():
+        db.session.execute(update(Quest), batch)
+    mark_user_changed(*{quest.assigned_to for quest in overdue})
+
+    # keep User.streak_score in step, relative so it can't clobber another writer
+    score_rows = [{'user_id': user_id, 'delta': delta} for user_id, delta in streak_deltas.items() if delta]
+    if score_rows:
+        Pet.settle_decay([row['user_id'] for row in score_rows], now)
+        users = User.__table__
+        db.session.execute(
+            update(users).where(users.c.id == bindparam('user_id'))
+            .values(streak_score=users.c.streak_score + bindparam('delta')),
+            score_rows
+        )
+    db.session.commit()
+
+    return len(rows)
+
+
+def rollover_user_quests(user_id, now=None):
+    return rollover_quests([user_id], now)
+
+
+def next_due_dates(user_ids=None, now=None):
+    """ Earliest upcoming due date per user, used to (re)build the scheduler heap.
+
+        Returns:
+            List -> (user_id, due_date) rows, one per user with a future due date
+    """
+    now = now or datetime.now(tz=pytz.utc)
+
+    query = (
+        select(Quest.assigned_to, func.min(Quest.due_date))
+        .where(Quest.due_date >= now)
+        .group_by(Quest.assigned_to)
+    )
+    if user_ids is not None:
+        query = query.where(Quest.assigned_to.in_(user_ids))
+
+    return db.session.execute(query).all()
+
+
+def overdue_user_ids(now=None):
+    """ Users with at least one quest a rollover would change, so rolling a user over takes them off the list. """
+    now = now or datetime.now(tz=pytz.utc)
+
+    return db.session.execute(
+        select(Quest.assigned_to).where(rollover_due(now)).distinct()
+    ).scalars().all()
@@ -0,0 +1,174 @@
+""" Background quest rollover.
+
+    Keeps a min-heap of (due_date, user_id) in memory and wakes up when the
+    earliest quest falls due, rolling over the due users in batches so that
+    requests never have to do it themselves.
+
+    Every app worker runs one of these, but only the worker holding the lock
+    file actually rolls quests over. The others sit idle and take over if the
+    leader process goes away. Quests created in another worker are picked up
+    by the periodic rebuild from the database.
+"""
+from models import db
+from rollover import rollover_quests, next_due_dates, overdue_user_ids
+from datetime import datetime
+import heapq
+import os
+import pytz
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, where we only ever run the single dev server
+    fcntl = None
+
+
+class RolloverScheduler:
+
+    def __init__(self, app, batch_size=200, poll_interval=60, rebuild_interval=300, lock_path=None):
+        self.app = app
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        self.lock_path = lock_path or os.path.join(app.instance_path, 'rollover.lock')
+
+        self._heap = []
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._lock_file = None
+        self._pid = None
+        self._stopping = False
+
+    def ensure_started(self):
+        # threads don't survive a fork, so every worker process starts its own
+        if self._pid != os.getpid():
+            # a lock inherited from the parent is the parent's, not ours
+            if self._lock_file and self._lock_file is not True:
+                self._lock_file.close()
+            self._lock_file = None
+            self.start()
+
+    def start(self):
+        self._pid = os.getpid()
+        self._stopping = False
+        self._heap = []
+        self._thread = threading.Thread(target=self._run, name='rollover-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join()
+        self._release_leadership()
+
+    def schedule(self, user_id, due_date):
+        """ Tell the scheduler about a new or moved due date.
+
+            Only the leader keeps a heap. A follower would never pop what it pushed, and when it
+            does take over, its first rebuild loads the due dates from the database anyway.
+        """
+        if not self._lock_file:
+            return
+        if due_date.tzinfo is None:
+            due_date = due_date.replace(tzinfo=pytz.utc)
+
+        with self._wakeup:
+            heapq.heappush(self._heap, (due_date, user_id))
+            self._wakeup.notify()
+
+    def rebuild(self):
+        """ Catch up on anything already overdue, then reload the heap from the database. """
+        now = datetime.now(tz=pytz.utc)
+
+        with self.app.app_context():
+            overdue = overdue_user_ids(now)
+            for start in range(0, len(overdue), self.batch_size):
+                rollover_quests(overdue[start:start + self.batch_size], now)
+
+            heap = [(due_date.replace(tzinfo=pytz.utc), user_id)
+                    for user_id, due_date in next_due_dates(now=now)]
+            db.session.remove()
+
+        heapq.heapify(heap)
+        with self._wakeup:
+            self._heap = heap
+
+    def run_due(self):
+        """ Roll over every user whose earliest due date has passed. """
+        now = datetime.now(tz=pytz.utc)
+
+        with self._wakeup:
+            due_users = set()
+            while self._heap and self._heap[0][0] <= now:
+                due_users.add(heapq.heappop(self._heap)[1])
+
+        if not due_users:
+            return 0
+
+        due_users = list(due_users)
+        rolled = 0
+        with self.app.app_context():
+            for start in range(0, len(due_users), self.batch_size):
+                batch = due_users[start:start + self.batch_size]
+                rolled += rollover_quests(batch, now)
+
+                for user_id, due_date in next_due_dates(batch, now):
+                    self.schedule(user_id, due_date)
+            db.session.remove()
+
+        return rolled
+
+    def _run(self):
+        last_rebuild = None
+
+        while not self._stopping:
+            if not self._acquire_leadership():
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                now = datetime.now(tz=pytz.utc)
+                if last_rebuild is None or (now - last_rebuild).total_seconds() >= self.rebuild_interval:
+                    self.rebuild()
+                    last_rebuild = now
+
+                self.run_due()
+            except Exception:
+                self.app.logger.error("Quest rollover failed.", exc_info=True)
+
+            with self._wakeup:
+                if self._stopping:
+                    break
+                timeout = self.poll_interval
+                if self._heap:
+                    until_due = (self._heap[0][0] - datetime.now(tz=pytz.utc)).total_seconds()
+                    timeout = max(0, min(timeout, until_due))
+                self._wakeup.wait(timeout)
+
+    def _acquire_leadership(self):
+        if self._lock_file:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self.app.logger.info(f"Process {os.getpid()} is now running quest rollover.")
+        self._lock_file = lock_file
+        return True
+
+    def _release_leadership(self):
+        if self._lock_file and self._lock_file is not True:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        self._lock_file = None
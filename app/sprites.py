@@ -0,0 +1,77 @@
+""" Packs each pet's animation GIFs into one sprite atlas.
+
+    Every animation becomes a row of frames in a single PNG, and a small JSON
+    file records the frame size, which row each animation is on and how long
+    each frame shows for. The home page then loads one image for the user's
+    pet instead of a GIF per animation. Called from assets.build_assets.
+"""
+from io import BytesIO
+import os
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:  # only needed at build time
+    Image = None
+
+ANIMATIONS_DIR = 'Pet_Animations'
+DEFAULT_FRAME_DURATION = 100
+
+
+def animation_key(pet_type, filename):
+    # Cat_Calico_Walk_Left.gif -> walkLeft, matching the names home.html already uses
+    suffix = os.path.splitext(filename)[0][len(pet_type) + 1:]
+    first, *rest = suffix.split('_')
+    return first.lower() + ''.join(part.capitalize() for part in rest)
+
+
+def read_frames(path):
+    with Image.open(path) as gif:
+        return [(frame.convert('RGBA'), frame.info.get('duration') or DEFAULT_FRAME_DURATION)
+                for frame in ImageSequence.Iterator(gif)]
+
+
+def pack_pet_atlas(pet_dir):
+    """ Packs every GIF in one pet's folder.
+
+        Returns:
+            Tuple -> (atlas PNG bytes, metadata dict without the image path)
+    """
+    pet_type = os.path.basename(pet_dir)
+    animations = {
+        animation_key(pet_type, filename): read_frames(os.path.join(pet_dir, filename))
+        for filename in sorted(os.listdir(pet_dir)) if filename.lower().endswith('.gif')
+    }
+
+    frame_width = max(frame.width for frames in animations.values() for frame, _ in frames)
+    frame_height = max(frame.height for frames in animations.values() for frame, _ in frames)
+    columns = max(len(frames) for frames in animations.values())
+
+    atlas = Image.new('RGBA', (frame_width * columns, frame_height * len(animations)))
+    metadata = {
+        "frame_width": frame_width,
+        "frame_height": frame_height,
+        "columns": columns,
+        "rows": len(animations),
+        "animations": {},
+    }
+
+    for row, (key, frames) in enumerate(animations.items()):
+        for column, (frame, _) in enumerate(frames):
+            atlas.paste(frame, (column * frame_width, row * frame_height))
+        metadata["animations"][key] = {"row": row, "durations": [duration for _, duration in frames]}
+
+    buffer = BytesIO()
+    atlas.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue(), metadata
+
+
+def pet_dirs(static_folder):
+    animations_folder = os.path.join(static_folder, ANIMATIONS_DIR)
+    if not os.path.isdir(animations_folder):
+        return []
+    return [os.path.join(animations_folder, name) for name in sorted(os.listdir(animations_folder))
+            if os.path.isdir(os.path.join(animations_folder, name))]
+
+
+def atlas_name(pet_type):
+    return f"{ANIMATIONS_DIR}/{pet_type}/atlas.json"
@@ -0,0 +1,272 @@
+""" Per-user cache of the state the API reads on every call.
+
+    A snapshot is everything about one user the pet and home endpoints need:
+    the pet's stored stats, food and decay rates, and the active quest list
+    (see homestate.load_snapshot). It's kept as plain JSON-able data, keyed
+    by user id, bounded in size (least recently used goes first) and with a
+    TTL as a backstop.
+
+    Writes invalidate it. After each flush the session notes which users its
+    new, changed and deleted Pets, Quests and Users belong to, UPDATE/INSERT
+    statements say so with models.mark_user_changed(), and on commit those
+    users' snapshots are dropped (on rollback the notes are just thrown away).
+    A snapshot that was being loaded while one of its users was invalidated
+    is never stored, so a slow read can't put old state back.
+
+    Backends:
+        memory  -> per process, the default. Other workers' writes show up once the TTL runs out.
+        sqlite  -> a small SQLite file in the instance folder that every worker on the host shares,
+                   so an invalidation in one is seen by all.
+
+    Hits, misses, evictions and invalidations are counted per process and shown on /metrics.
+    Anything else that needs to know when a user changed can add_listener().
+"""
+from models import db, Pet, Quest, User, CHANGED_USERS
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryBackend:
+
+    def __init__(self, max_entries=1000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # user id -> (expires, snapshot), least recently used first
+        self._invalidated = OrderedDict()  # user id -> when, oldest first, only kept for a TTL
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, loaded_at, now):
+        """ Stores a snapshot loaded at loaded_at, unless it was invalidated since. Returns how many were evicted. """
+        with self._lock:
+            if self._invalidated.get(key, 0) >= loaded_at:
+                return 0
+            self._entries[key] = (loaded_at + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def invalidate(self, keys, now):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._invalidated[key] = now
+                self._invalidated.move_to_end(key)
+            # anything loaded longer ago than the TTL has expired anyway
+            while self._invalidated and next(iter(self._invalidated.values())) < now - self.ttl:
+                self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteBackend:
+    """ Shared between worker processes through a SQLite file. The contents are disposable, so it runs
+        without fsyncs, and last use is only refreshed once a second so hits rarely need the write lock.
+    """
+
+    def __init__(self, path, max_entries=1000, ttl=30):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS entries "
+                               "(user_id INTEGER PRIMARY KEY, snapshot TEXT NOT NULL, expires REAL NOT NULL, "
+                               "last_used REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used)")
+            connection.execute("CREATE TABLE IF NOT EXISTS invalidations (user_id INTEGER PRIMARY KEY, at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_invalidations_at ON invalidations (at)")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        return connection
+
+    def _connection(self):
+        # one connection per thread, and a fresh one after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key, now):
+        connection = self._connection()
+        row = connection.execute("SELECT snapshot, expires, last_used FROM entries WHERE user_id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        snapshot, expires, last_used = row
+        if expires <= now:
+            connection.execute("DELETE FROM entries WHERE user_id = ? AND expires <= ?", (key, now))
+            return None
+        if last_used < now - 1:
+            connection.execute("UPDATE entries SET last_used = ? WHERE user_id = ?", (now, key))
+        return json.loads(snapshot)
+
+    def put(self, key, value, loaded_at, now):
+        """ Stores a snapshot loaded at loaded_at, unless it was invalidated since. Returns how many were evicted. """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            invalidated = connection.execute("SELECT 1 FROM invalidations WHERE user_id = ? AND at >= ?",
+                                             (key, loaded_at)).fetchone()
+            if invalidated:
+                return 0
+            connection.execute("INSERT OR REPLACE INTO entries (user_id, snapshot, expires, last_used) VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value), loaded_at + self.ttl, now))
+
+            evicted = 0
+            extra = connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if extra > 0:
+                evicted = connection.execute("DELETE FROM entries WHERE user_id IN "
+                                             "(SELECT user_id FROM entries ORDER BY last_used LIMIT ?)", (extra,)).rowcount
+            return evicted
+        finally:
+            connection.execute("COMMIT")
+
+    def invalidate(self, keys, now):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("DELETE FROM entries WHERE user_id = ?", [(key,) for key in keys])
+            connection.executemany("INSERT OR REPLACE INTO invalidations (user_id, at) VALUES (?, ?)",
+                                   [(key, now) for key in keys])
+            # anything loaded longer ago than the TTL has expired anyway
+            connection.execute("DELETE FROM invalidations WHERE at < ?", (now - self.ttl,))
+        finally:
+            connection.execute("COMMIT")
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+
+class StateCache:
+
+    def __init__(self, app=None, loader=None, backend=None):
+        self.loader = loader
+        self.backend = backend or MemoryBackend()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('STATE_CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('STATE_CACHE_SIZE', 1000)
+        ttl = app.config.get('STATE_CACHE_TTL', 30)
+
+        if name == 'memory':
+            self.backend = MemoryBackend(max_entries, ttl)
+        elif name == 'sqlite':
+            path = app.config.get('STATE_CACHE_PATH') or os.path.join(app.instance_path, 'state_cache.db')
+            self.backend = SqliteBackend(path, max_entries, ttl)
+        else:
+            raise ValueError(f"Unknown STATE_CACHE_BACKEND {name!r}, expected 'memory' or 'sqlite'")
+
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, user_id):
+        """ The user's snapshot, from the cache or loaded and cached now.
+
+            Treat it as read-only, with the memory backend every caller gets the same object.
+
+            Returns:
+                Dict -> the snapshot, or None if the user doesn't exist
+        """
+        loaded_at = time.time()
+        snapshot = self.backend.get(user_id, loaded_at)
+        if snapshot is not None:
+            self._count('hits')
+            return snapshot
+
+        self._count('misses')
+        snapshot = self.loader(user_id)
+        # don't cache what this session has changed but not committed, it could still be rolled back
+        if snapshot is not None and user_id not in db.session.info.get(CHANGED_USERS, ()):
+            evicted = self.backend.put(user_id, snapshot, loaded_at, time.time())
+            if evicted:
+                self._count('evictions', evicted)
+        return snapshot
+
+    def add_listener(self, listener):
+        """ listener(user_ids) is called after those users' snapshots are invalidated. It mustn't block. """
+        self._listeners.append(listener)
+
+    def invalidate(self, *user_ids, notify=True):
+        """ Drops the users' snapshots. notify=False skips the listeners, for changes they already know about. """
+        if user_ids:
+            self.backend.invalidate(user_ids, time.time())
+            self._count('invalidations', len(user_ids))
+            if notify:
+                for listener in self._listeners:
+                    listener(user_ids)
+
+    # session events
+
+    def _after_flush(self, session, flush_context):
+        changed = session.info.setdefault(CHANGED_USERS, set())
+        for instance in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(instance, Quest):
+                changed.add(instance.assigned_to)
+            elif isinstance(instance, Pet):
+                changed.add(instance.user_id)
+            elif isinstance(instance, User):
+                changed.add(instance.id)
+        changed.discard(None)
+
+    def _after_commit(self, session):
+        self.invalidate(*session.info.pop(CHANGED_USERS, ()))
+
+    def _after_rollback(self, session):
+        session.info.pop(CHANGED_USERS, None)
+
+    def metrics(self):
+        """ Prometheus lines for the counters, added to /metrics. """
+        lines = []
+        for name, help_text in (
+            ('hits', 'State cache lookups answered from the cache.'),
+            ('misses', 'State cache lookups that loaded from the database.'),
+            ('evictions', 'Snapshots dropped to stay within STATE_CACHE_SIZE.'),
+            ('invalidations', 'Snapshots dropped because a commit changed the user.'),
+        ):
+            lines += [f'# HELP kinetiquest_state_cache_{name}_total {help_text}',
+                      f'# TYPE kinetiquest_state_cache_{name}_total counter',
+                      f'kinetiquest_state_cache_{name}_total {getattr(self, name)}']
+        return lines
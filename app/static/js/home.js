@@ -0,0 +1,740 @@
+let currentTaskType = '';
+let foodQuantity = 1;
+let specialfoodQuantity = 1;
+
+function togglePopup(popupId, show) {
+    const popupElement = document.getElementById(popupId);
+    const overlayElement = document.getElementById('popupOverlay');
+    popupElement.style.display = show ? 'block' : 'none';
+    overlayElement.style.display = show ? 'block' : 'none';
+    if (show) {
+        overlayElement.style.pointerEvents = 'auto';
+    } else {
+        overlayElement.style.pointerEvents = 'none';
+    }
+}
+
+function showProfile() {
+    togglePopup('profilePopup', true);
+}
+
+function closeProfilePopup() {
+    togglePopup('profilePopup', false);
+}
+
+function showLogout() {
+    togglePopup('logoutPopup', true);
+}
+
+function closeLogoutPopup() {
+    togglePopup('logoutPopup', false);
+}
+
+function logoutProfile() {
+    togglePopup('logoutPopup', false);
+    window.location.href = '/';
+}
+
+function closeCompletedTasks() {
+    togglePopup('completedTasksPopup', false);
+    document.getElementById('completedTasksOverlay').style.display = 'none';
+}
+
+function closeTaskPopup() {
+    document.getElementById('taskPopup').style.display = 'none';
+    document.getElementById('taskOverlay').style.display = 'none';
+}
+
+// Fill in pet stats, food and quests from one request.
+// The browser revalidates with the ETag, so an unchanged state comes back as an empty 304.
+function loadHomeState() {
+    fetch('/api/home_state')
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                console.error('Failed to fetch home state:', data.error);
+                return;
+            }
+            renderHomeState(data);
+        })
+        .catch(error => {
+            console.error('Error fetching home state:', error);
+        });
+}
+
+function renderHomeState(data) {
+    renderPet(data.pet);
+    renderInventory(data.inventory);
+
+    const taskList = document.getElementById('dailyTasks');
+    taskList.innerHTML = '';
+    data.quests.forEach(renderQuest);
+}
+
+function renderPet(pet) {
+    if (!pet) return;
+    if (pet.happiness !== undefined) document.getElementById('happiness').value = pet.happiness;
+    if (pet.hunger !== undefined) document.getElementById('hunger').value = pet.hunger;
+}
+
+function renderInventory(inventory) {
+    if (inventory.food_quantity !== undefined) foodQuantity = inventory.food_quantity;
+    if (inventory.special_food_quantity !== undefined) specialfoodQuantity = inventory.special_food_quantity;
+    updateFoodQuantity(); // Update the displayed quantities
+}
+
+function renderQuest(quest) {
+    const existing = document.querySelector(`.task[data-task-id='${quest.id}']`);
+    if (existing) {
+        const taskText = existing.querySelector('.task-text');
+        if (taskText && document.activeElement !== taskText) taskText.innerText = quest.description;
+        return;
+    }
+
+    const taskWrapper = document.createElement('div');
+    taskWrapper.classList.add('task-wrapper');
+
+    const taskContainer = createTaskContainer(quest.description, quest.id);
+    const deleteButton = document.createElement('button');
+    deleteButton.classList.add('delete-btn');
+    deleteButton.innerHTML = '&times;';
+    deleteButton.onclick = () => deleteTask(quest.id);
+    taskContainer.appendChild(deleteButton);
+
+    taskWrapper.appendChild(taskContainer);
+    document.getElementById('dailyTasks').appendChild(taskWrapper);
+}
+
+function removeQuest(questId) {
+    const task = document.querySelector(`.task[data-task-id='${questId}']`);
+    // quests completed in this tab stay crossed off until the next visit
+    if (task && !task.classList.contains('completed-task')) {
+        task.closest('.task-wrapper').remove();
+    }
+}
+
+// One long-lived connection that pushes changes made here, in other tabs and by the server,
+// instead of re-fetching after every action. The browser reconnects on its own if it drops.
+function listenForUpdates() {
+    const events = new EventSource('/api/events');
+    events.addEventListener('state', event => renderHomeState(JSON.parse(event.data)));
+    events.addEventListener('pet', event => renderPet(JSON.parse(event.data)));
+    events.addEventListener('inventory', event => renderInventory(JSON.parse(event.data)));
+    events.addEventListener('quests', event => {
+        const data = JSON.parse(event.data);
+        data.changed.forEach(renderQuest);
+        data.removed.forEach(removeQuest);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    if (window.EventSource) {
+        listenForUpdates();  // its first event is the whole home state
+    } else {
+        loadHomeState();
+    }
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.task-text').forEach(taskElement => {
+        taskElement.addEventListener('focus', function() {
+            this.dataset.originalValue = this.innerText;
+        });
+        taskElement.addEventListener('blur', function() {
+            const taskId = this.closest('.task').dataset.taskId;
+            const newDescription = this.innerText;
+            updateTask(taskId, newDescription);
+        });
+        taskElement.addEventListener('keydown', function(event) {
+            if (event.key === 'Escape') {
+                this.innerText = this.dataset.originalValue;
+                this.blur();
+            } else if (event.key === 'Enter') {
+                event.preventDefault();
+                this.blur();
+            }
+        });
+        taskElement.addEventListener('input', function() {
+            if (this.innerText.length > 29) {
+                this.innerText = this.innerText.substring(0, 29);
+                const range = document.createRange();
+                const selection = window.getSelection();
+                range.selectNodeContents(this);
+                range.collapse(false);
+                selection.removeAllRanges();
+                selection.addRange(range);
+            }
+        });
+    });
+});
+
+function dimContent(dim) {
+    const dimClass = 'dimmed';
+    const elementsToDim = document.querySelectorAll('body > *:not(#popupOverlay):not(#profilePopup):not(#logoutPopup)');
+    elementsToDim.forEach(element => {
+        if (dim) {
+            element.classList.add(dimClass);
+        } else {
+            element.classList.remove(dimClass);
+        }
+    });
+}
+
+document.getElementById('specificTime').addEventListener('change', function() {
+    document.getElementById('dueTimeInput').disabled = !this.checked;
+});
+document.getElementById('endOfDay').addEventListener('change', function() {
+    document.getElementById('dueTimeInput').disabled = true;
+});
+
+function toggleRepeatDays() {
+    const repeatOption = document.getElementById('repeatOption').value;
+    const repeatDaysContainer = document.getElementById('repeatDaysInputContainer');
+    repeatDaysContainer.style.display = (repeatOption === 'specific') ? 'flex' : 'none';
+}
+
+function getSelectedRepeatDays() {
+    const days = [];
+    document.querySelectorAll('#repeatDaysInputContainer input[type="checkbox"]:checked').forEach(checkbox => 
+    { days.push(checkbox.value); });
+    return days;
+}
+
+function addTask() {
+    const taskInputElement = document.getElementById('taskInput');
+    const taskInput = taskInputElement.value;
+    const dueDate = document.getElementById('dueDateInput').value;
+    const dueTime = document.querySelector('input[name="dueTime"]:checked').value === "specific"
+        ? document.getElementById('dueTimeInput').value
+        : "23:59";
+    const repeatOption = document.getElementById('repeatOption').value;
+    const repeatDays = repeatOption === "specific" ? getSelectedRepeatDays() : [];
+    const userTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+    if (taskInput.length > 29) {
+        alert("Task description cannot exceed 29 characters.");
+        return;
+    }
+
+    if (!taskInput.trim()) {
+        alert("Task description cannot be empty.");
+        return;
+    }
+
+    const formData = new URLSearchParams();
+    formData.append('task_description', taskInput);
+    formData.append('due_date', dueDate);
+    formData.append('due_time', dueTime);
+    formData.append('task_type', repeatOption);
+    formData.append('timezone', userTimezone);
+    repeatDays.forEach(day => formData.append('repeat_days', day));
+
+    fetch('/api/add_task', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+        body: formData.toString()
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            taskInputElement.value = '';
+            // the live update may have added it already
+            if (document.querySelector(`.task[data-task-id='${data.task_id}']`)) return;
+
+            const taskList = document.getElementById(currentTaskType === 'daily' ? 'dailyTasks' : 'weeklyTasks');
+            const newTaskWrapper = document.createElement('div');
+            newTaskWrapper.classList.add('task-wrapper');
+
+            const taskContainer = createTaskContainer(taskInput, data.task_id);
+            newTaskWrapper.appendChild(taskContainer);
+
+            const deleteButton = document.createElement('button');
+            deleteButton.classList.add('delete-btn');
+            deleteButton.innerHTML = '&times;';
+            deleteButton.onclick = () => deleteTask(data.task_id);
+            newTaskWrapper.appendChild(deleteButton);
+
+            taskList.appendChild(newTaskWrapper);
+        } else {
+            alert('Failed to add task: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Error occurred while making the request:', error);
+        alert('An error occurred while adding the task.');
+    });
+    closeTaskPopup();
+}
+
+function createTaskContainer(taskInput, taskId) {
+    const taskContainer = document.createElement('div');
+    taskContainer.classList.add('task');
+    taskContainer.dataset.taskId = taskId;
+
+    const completeCheckbox = document.createElement('input');
+    completeCheckbox.type = 'checkbox';
+    completeCheckbox.classList.add('complete-checkbox', 'styled-checkbox');
+    completeCheckbox.onclick = () => markTaskComplete(taskId);
+    taskContainer.appendChild(completeCheckbox);
+
+    const taskText = document.createElement('span');
+    taskText.classList.add('task-text');
+    taskText.contentEditable = 'true';
+    taskText.textContent = taskInput;
+    addTaskTextEventListeners(taskText);
+    taskContainer.appendChild(taskText);
+
+    return taskContainer;
+}
+
+function addTaskTextEventListeners(taskText) {
+    taskText.addEventListener('focus', function() {
+        this.dataset.originalValue = this.innerText;
+    });
+    taskText.addEventListener('blur', function() {
+        const taskId = this.closest('.task').dataset.taskId;
+        const newDescription = this.innerText;
+        updateTask(taskId, newDescription);
+    });
+    taskText.addEventListener('keydown', function(event) {
+        if (event.key === 'Escape') {
+            this.innerText = this.dataset.originalValue;
+            this.blur();
+        } else if (event.key === 'Enter') {
+            event.preventDefault();
+            this.blur();
+        }
+    });
+}
+
+function updateTask(taskId, newDescription) {
+    if (!newDescription.trim()) {
+        alert("Task description cannot be empty.");
+        return;
+    }
+    fetch('/api/update_task', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        },
+        body: `task_id=${encodeURIComponent(taskId)}&new_description=${encodeURIComponent(newDescription)}`
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            alert('Failed to update task: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred while updating the task.');
+    });
+}
+
+function adjustScrollableHeight() {
+    const scrollableTasks = document.querySelector('.scrollable-tasks');
+    const taskCount = scrollableTasks.children.length;
+
+    if (taskCount === 0) {
+        scrollableTasks.style.height = 'auto';
+    } else {
+        scrollableTasks.style.height = '';
+    }
+}
+
+// Quest deletes and completions made in quick succession go to the server together,
+// as one /api/batch request and one commit instead of a request each.
+const BATCH_DELAY_MS = 300;
+let pendingOperations = [];
+let batchTimer = null;
+
+function queueQuestOperation(operation) {
+    return new Promise((resolve, reject) => {
+        pendingOperations.push({ operation, resolve, reject });
+        if (!batchTimer) {
+            batchTimer = setTimeout(sendQuestOperations, BATCH_DELAY_MS);
+        }
+    });
+}
+
+function sendQuestOperations() {
+    const batch = pendingOperations;
+    pendingOperations = [];
+    batchTimer = null;
+
+    fetch('/api/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations: batch.map(item => item.operation) })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.results) {
+            throw new Error(data.error);
+        }
+        // food earned by the batch comes back as the server's counts, shown as they are
+        if (data.food_quantity !== undefined) {
+            renderInventory(data);
+        }
+        // each result looks like the single endpoint's response
+        batch.forEach((item, i) => item.resolve(data.results[i]));
+    })
+    .catch(error => batch.forEach(item => item.reject(error)));
+}
+
+function deleteTask(taskId) {
+    queueQuestOperation({ op: 'delete', task_id: taskId })
+    .then(data => {
+        if (data.success) {
+            // Remove the task from the list in the frontend
+            const taskElement = document.querySelector(`.task[data-task-id='${taskId}']`)?.closest('.task-wrapper');
+            if (taskElement) {
+                taskElement.remove();
+            }
+        } else {
+            alert('Failed to delete task: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred while deleting the task.');
+    });
+}
+
+function markTaskComplete(taskId) {
+    queueQuestOperation({ op: 'complete', task_id: taskId })
+    .then(data => {
+        if (data.success) {
+            const taskWrapper = document.querySelector(`.task[data-task-id='${taskId}']`)?.closest('.task-wrapper');
+            if (taskWrapper) {
+                taskWrapper.querySelector('.task').classList.add('completed-task');
+                taskWrapper.querySelector('.complete-checkbox').disabled = true;
+                taskWrapper.querySelector('.task').style.opacity = 0.6;
+                taskWrapper.querySelector('.task').style.textDecoration = 'line-through';
+            }
+
+            // The food itself is shown from the server's count, which the batch response and the event
+            // stream's inventory event bring, so it isn't added to here as well
+            if (data.task_type === 'daily' || data.task_type === 'none') {
+                alert('Congratulations for completing an easier quest! You earned food!');
+            } else if (data.task_type === 'weekly' || data.task_type === 'specific') {
+                alert('Congratulations for completing a more difficult quest! You earned special food!');
+            }
+        } else {
+            alert('Failed to mark task as complete.');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred while marking the task as complete.');
+    });
+}
+
+function allowDrop(ev) {
+    ev.preventDefault();
+}
+
+function drag(ev) {
+    ev.dataTransfer.setData("text", ev.target.id);
+}
+
+function drop(ev) {
+    ev.preventDefault();
+    const data = ev.dataTransfer.getData("text");
+
+    if (data === "logo") {
+        alert(':(');
+    }
+    if (data === "foodIMG" || data === "specialfoodIMG") {
+        // alert('Food given to pet!');
+        if ((data === "foodIMG" && foodQuantity > 0)
+            || (data === "specialfoodIMG" && specialfoodQuantity > 0)) {
+                feedPet(data === 'foodIMG' ? 'food' : 'special');
+            }
+    }
+}
+
+function showTaskPopup(taskType) {
+    currentTaskType = taskType;
+    document.getElementById('taskPopup').style.display = 'block';
+    document.getElementById('taskOverlay').style.display = 'block';
+
+    const repeatDaysInput = document.getElementById('repeatDaysInput');
+    repeatDaysInput.style.display = taskType === 'daily' ? 'none' : 'block';
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const petElement = document.getElementById('pet');
+    const petArea = document.querySelector('.pet-display');
+    const petType = petArea.dataset.petType;
+
+    const petAnimations = {
+        idle: `/static/Pet_Animations/${petType}/${petType}_Idle.gif`,
+        pet: `/static/Pet_Animations/${petType}/${petType}_Pet.gif`,
+        walkRight: `/static/Pet_Animations/${petType}/${petType}_Walk_Right.gif`,
+        walkLeft: `/static/Pet_Animations/${petType}/${petType}_Walk_Left.gif`,
+        treat: `/static/Pet_Animations/${petType}/${petType}_Treat.gif`
+    };
+
+    let petPosition = { x: 100, y: 100 };
+    let targetPosition = { x: 100, y: 100 };
+    const speed = 0.3;
+    let currentAnimation = 'idle';
+    let isAnimating = false; // Prevent movement during animations
+
+    // With a built sprite atlas the pet is a <div> stepping through frames of one image,
+    // otherwise it's an <img> swapping between the per-animation GIFs.
+    let petAtlas = null;
+    let frameTimer = null;
+
+    function showAnimation(animation) {
+        if (!petElement.dataset.atlas) {
+            petElement.src = petAnimations[animation];
+            return;
+        }
+        if (!petAtlas) return; // still loading, it starts on idle once loaded
+
+        clearTimeout(frameTimer);
+        const { row, durations } = petAtlas.animations[animation];
+        let frame = 0;
+        const step = () => {
+            const x = petAtlas.columns > 1 ? frame / (petAtlas.columns - 1) * 100 : 0;
+            const y = petAtlas.rows > 1 ? row / (petAtlas.rows - 1) * 100 : 0;
+            petElement.style.backgroundPosition = `${x}% ${y}%`;
+            frameTimer = setTimeout(step, durations[frame]);
+            frame = (frame + 1) % durations.length;
+        };
+        step();
+    }
+
+    if (petElement.dataset.atlas) {
+        const atlasUrl = new URL(petElement.dataset.atlas, location.href);
+        fetch(atlasUrl)
+            .then(response => response.json())
+            .then(atlas => {
+                petAtlas = atlas;
+                petElement.style.backgroundImage = `url('${new URL(atlas.image, atlasUrl)}')`;
+                petElement.style.backgroundSize = `${atlas.columns * 100}% ${atlas.rows * 100}%`;
+                petElement.style.backgroundRepeat = 'no-repeat';
+                showAnimation(currentAnimation);
+            })
+            .catch(console.error);
+    }
+
+    showAnimation('idle');
+
+    function setPetAnimation(animation) {
+        if (isAnimating) return; // prevent overlapping animations
+
+        showAnimation(animation);
+        isAnimating = true; // Stop movement
+
+        setTimeout(() => {
+            showAnimation('idle');
+            isAnimating = false; // Resume movement
+
+            // continue walking towards the target position
+            const deltaX = targetPosition.x - petPosition.x;
+            if (Math.abs(deltaX) > 0) {
+                if (deltaX > 0) {
+                    showAnimation('walkRight');
+                    currentAnimation = 'walkRight';
+                } else {
+                    showAnimation('walkLeft');
+                    currentAnimation = 'walkLeft';
+                }
+            } else {
+                showAnimation('idle');
+                currentAnimation = 'idle';
+            }
+
+            updatePetPosition();
+            }, 2000);
+
+    }
+
+    // Expose the animation function globally
+    window.setPetAnimation = setPetAnimation;
+
+    function updatePetPosition() {
+        // skip if animation
+        if (isAnimating) return;
+
+        const deltaX = targetPosition.x - petPosition.x;
+        const deltaY = targetPosition.y - petPosition.y;
+        const distance = Math.sqrt(deltaX * deltaX + deltaY * deltaY);
+
+        if (distance < speed) {
+            petPosition.x = targetPosition.x;
+            petPosition.y = targetPosition.y;
+            if (currentAnimation !== 'idle') {
+                showAnimation('idle');
+                currentAnimation = 'idle';
+            }
+        } else {
+            petPosition.x += (deltaX / distance) * speed;
+            petPosition.y += (deltaY / distance) * speed;
+
+            if (deltaX >= 0 && currentAnimation !== 'walkRight') {
+                showAnimation('walkRight');
+                currentAnimation = 'walkRight';
+            } else if (deltaX < 0 && currentAnimation !== 'walkLeft') {
+                showAnimation('walkLeft');
+                currentAnimation = 'walkLeft';
+            }
+        }
+
+        petPosition.x = Math.max(0, Math.min(petPosition.x, petArea.offsetWidth - petElement.offsetWidth));
+        petPosition.y = Math.max(0, Math.min(petPosition.y, petArea.offsetHeight - petElement.offsetHeight));
+        petElement.style.transform = `translate(${petPosition.x}px, ${petPosition.y}px)`;
+
+        requestAnimationFrame(updatePetPosition);
+    }
+
+    function movePetRandomly() {
+        // skip if animation
+        if (isAnimating) return;
+
+        const maxX = petArea.clientWidth - petElement.clientWidth;
+        const maxY = petArea.clientHeight - petElement.clientHeight - 20;
+
+        targetPosition.x = Math.floor(Math.random() * maxX);
+        targetPosition.y = Math.floor(Math.random() * maxY);
+    }
+
+    requestAnimationFrame(updatePetPosition);
+    setInterval(movePetRandomly, 5000);
+
+    petElement.addEventListener('click', () => {
+        setPetAnimation('pet');
+        // API call to update happiness
+        fetch('/api/play_with_pet', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+        }).then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                document.getElementById('happiness').value = data.happiness;
+            } else {
+                alert(data.message);
+            }
+        }).catch(console.error);
+    });
+
+    function updateFoodQuantity() {
+        document.getElementById('foodQuantityDisplay').innerText = `Food Quantity: ${foodQuantity}`;
+    }
+
+    document.addEventListener('dragover', allowDrop);
+    document.addEventListener('drop', drop);
+});
+
+function feedPet(foodType) {
+        fetch('/api/feed_pet', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+            body: `type=${foodType}`
+        }).then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                foodQuantity = data.food_quantity;  
+                specialfoodQuantity = data.special_food_quantity;
+                updateFoodQuantity();
+                document.getElementById('hunger').value = data.hunger;
+
+                // Trigger the treat animation
+                setPetAnimation('treat');
+            } else {
+                alert(data.message);
+            }
+        }).catch(console.error);
+    }
+
+function updateFoodQuantity() {
+    document.getElementById('foodQuantity').textContent = foodQuantity;
+    document.getElementById('specialfoodQuantity').textContent = specialfoodQuantity;
+}
+
+function saveFoodQuantities() {
+    fetch('/api/update_food_quantities', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        },
+        body: `food_quantity=${foodQuantity}&special_food_quantity=${specialfoodQuantity}`
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            console.error('Failed to update food quantities on server.');
+        }
+    })
+    .catch(error => {
+        console.error('Error updating food quantities:', error);
+    });
+}
+
+function showCompletedTasks() {
+    // the history panel only shows the last week
+    const lastWeek = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString();
+    fetch(`/api/completed_tasks?since=${encodeURIComponent(lastWeek)}&limit=200`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.tasks) {
+                // Clear previous tasks
+                const dailyTasksListElement = document.getElementById('dailyTasksList');
+                dailyTasksListElement.innerHTML = '';
+
+                // Populate lists with completed tasks
+                data.tasks.forEach(task => {
+                    const taskElement = document.createElement('div');
+                    taskElement.classList.add('completed-task-item');
+
+                    const taskDescription = document.createElement('span');
+                    taskDescription.textContent = task.description;
+
+                    const completedDate = new Date(task.completed_at).toLocaleDateString();
+                    const completedDateSpan = document.createElement('span');
+                    completedDateSpan.classList.add('green-text');
+                    if (task.is_deleted) {
+                        completedDateSpan.textContent = ` (Deleted)`;
+                        completedDateSpan.style.color = 'grey';
+                    } else {
+                        completedDateSpan.textContent = ` (Completed at: ${completedDate})`;
+                    }
+
+                    taskElement.appendChild(taskDescription);
+                    taskElement.appendChild(completedDateSpan);
+
+                    // Add the task to the completed tasks list
+                    dailyTasksListElement.appendChild(taskElement);
+                });
+
+                // Show the popup
+                document.getElementById('completedTasksPopup').style.display = 'block';
+                document.getElementById('completedTasksOverlay').style.display = 'block';
+            } else {
+                alert('No tasks found.');
+            }
+        })
+        .catch(error => {
+            console.error('Error fetching tasks:', error);
+            alert('An error occurred while fetching tasks.');
+        });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const petImage = document.getElementById('petImage');
+
+    petImage.addEventListener('click', function() {
+        petImage.src = 'path/to/_pet.gif';
+
+        petImage.addEventListener('load', function() {
+            setTimeout(function() {
+                petImage.src = 'path/to/static_pet_image.jpg';
+            }, 3000);
+        });
+    });
+});
+
+window.onload = updateFoodQuantity;
@@ -0,0 +1,48 @@
+""" Consistency check and repair for the denormalized User.streak_score.
+
+    The score is updated incrementally by the quest write paths. This
+    recomputes it from the quest rows so drift (manual edits, old data,
+    a missed code path) can be spotted and fixed.
+
+    Usage:
+        flask --app app/app.py repair-streak-scores [--check]
+"""
+from models import db, User, Pet, Quest, mark_user_changed
+from sqlalchemy import select, func, update, bindparam
+
+
+def streak_score_mismatches():
+    """ Returns a list of (user_id, stored score, recomputed score) for users that disagree. """
+    recomputed = (
+        select(Quest.assigned_to.label('user_id'),
+               func.sum(Quest.reward * func.coalesce(Quest.streak, 0)).label('score'))
+        .group_by(Quest.assigned_to)
+        .subquery()
+    )
+
+    rows = db.session.execute(
+        select(User.id, User.streak_score, func.coalesce(recomputed.c.score, 0))
+        .outerjoin(recomputed, recomputed.c.user_id == User.id)
+        .where(User.streak_score != func.coalesce(recomputed.c.score, 0))
+    ).all()
+
+    return [tuple(row) for row in rows]
+
+
+def repair_streak_scores():
+    """ Rewrites every stored score that has drifted. Returns the mismatches it fixed. """
+    mismatches = streak_score_mismatches()
+
+    if mismatches:
+        Pet.settle_decay([user_id for user_id, _, _ in mismatches])
+        users = User.__table__
+        db.session.execute(
+            update(users).where(users.c.id == bindparam('user_id'))
+            .values(streak_score=bindparam('score')),
+            [{'user_id': user_id, 'score': score} for user_id, _, score in mismatches]
+        )
+        # the score sets the pet's decay rates
+        mark_user_changed(*(user_id for user_id, _, _ in mismatches))
+        db.session.commit()
+
+    return mismatches
@@ -0,0 +1,29 @@
+"""Index completed quests by end_time for keyset paging
+
+Revision ID: 0f6b2a8e9c47
+Revises: e7a9d41c0b58
+Create Date: 2026-10-18 11:48:10.365092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0f6b2a8e9c47'
+down_revision = 'e7a9d41c0b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (assigned_to, status) is a prefix of the new index, so the old one is redundant
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_assigned_to_status')
+        batch_op.create_index('ix_quest_assigned_to_status_end_time', ['assigned_to', 'status', 'end_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_assigned_to_status_end_time')
+        batch_op.create_index('ix_quest_assigned_to_status', ['assigned_to', 'status'], unique=False)
@@ -0,0 +1,48 @@
+"""Add quest_template catalog
+
+Revision ID: 5a3e91b7c2f4
+Revises: 0f6b2a8e9c47
+Create Date: 2026-10-18 12:40:56.208731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '5a3e91b7c2f4'
+down_revision = '0f6b2a8e9c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('quest_template',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('quest_type', sa.String(length=10), nullable=False),
+    sa.Column('reward', sa.Integer(), nullable=False),
+    sa.Column('repeat_days', sqlite.JSON(), nullable=True),
+    sa.Column('end_of_day', sa.Boolean(), nullable=True),
+    sa.Column('repeat', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # the presets used to live as quests on a placeholder user
+    op.execute(
+        "INSERT INTO quest_template (description, quest_type, reward, repeat_days, end_of_day, repeat) "
+        "SELECT quest.description, quest.quest_type, quest.reward, quest.repeat_days, quest.end_of_day, quest.repeat "
+        "FROM quest JOIN user ON user.id = quest.assigned_to "
+        "WHERE user.username = 'fake_user' ORDER BY quest.id"
+    )
+
+    # and the placeholder itself goes, it was a real account with a well known password
+    fake_user = "(SELECT id FROM user WHERE username = 'fake_user')"
+    op.execute(f"DELETE FROM quest WHERE assigned_to IN {fake_user}")
+    op.execute(f"DELETE FROM pet WHERE user_id IN {fake_user}")
+    op.execute("DELETE FROM user WHERE username = 'fake_user'")
+
+
+def downgrade():
+    op.drop_table('quest_template')
@@ -0,0 +1,35 @@
+"""Add decay_from to Pet table
+
+Revision ID: 7c4e2a9d1b36
+Revises: f2c7b5e18d93
+Create Date: 2026-10-18 18:02:37.415920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a9d1b36'
+down_revision = 'f2c7b5e18d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases that ran 9b1f3c2d7a10 before it stopped creating the column already have it
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('pet')}
+    if 'decay_from' in columns:
+        return
+
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('decay_from', sa.DateTime(timezone=True), nullable=True,
+                                      server_default=sa.func.current_timestamp()))
+
+    # existing pets have been decaying from their user's last update, keep it that way
+    op.execute("UPDATE pet SET decay_from = (SELECT account_updated FROM user WHERE user.id = pet.user_id)")
+
+
+def downgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.drop_column('decay_from')
@@ -0,0 +1,100 @@
+"""Bring quest and pet tables up to date with models.py
+
+Revision ID: 9b1f3c2d7a10
+Revises: 4e7aced6e3c0
+Create Date: 2026-10-18 10:12:03.114208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f3c2d7a10'
+down_revision = '4e7aced6e3c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # quests now point at their user directly instead of going through quest_assignment
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('assigned_to', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('reward', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('quest_type', sa.String(length=10), nullable=False, server_default='daily'))
+        batch_op.add_column(sa.Column('is_deleted', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('repeat', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('streak', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('start_time', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('due_date', sa.DateTime(timezone=True), nullable=True))
+        batch_op.add_column(sa.Column('repeat_days', sqlite.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('due_time', sa.Time(), nullable=True))
+        batch_op.add_column(sa.Column('end_of_day', sa.Boolean(), nullable=True))
+
+    op.execute(
+        "UPDATE quest SET reward = weight, "
+        "assigned_to = (SELECT user_id FROM quest_assignment WHERE quest_assignment.quest_id = quest.id)"
+    )
+    op.execute("UPDATE quest SET status = 'uncompleted' WHERE status IS NULL")
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=False)
+        batch_op.create_foreign_key('fk_quest_assigned_to_user', 'user', ['assigned_to'], ['id'])
+        batch_op.drop_column('weight')
+
+    op.drop_table('quest_assignment')
+
+    op.create_table('pet',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pet_type', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('happiness', sa.Integer(), nullable=False),
+    sa.Column('hunger', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('food_quantity', sa.Integer(), nullable=False),
+    sa.Column('special_food_quantity', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('pet')
+
+    op.create_table('quest_assignment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quest_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['quest_id'], ['quest.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO quest_assignment (user_id, quest_id) "
+        "SELECT assigned_to, id FROM quest WHERE assigned_to IS NOT NULL"
+    )
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('weight', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("UPDATE quest SET weight = reward")
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_quest_assigned_to_user', type_='foreignkey')
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=True)
+        batch_op.drop_column('end_of_day')
+        batch_op.drop_column('due_time')
+        batch_op.drop_column('repeat_days')
+        batch_op.drop_column('due_date')
+        batch_op.drop_column('end_time')
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('streak')
+        batch_op.drop_column('repeat')
+        batch_op.drop_column('is_deleted')
+        batch_op.drop_column('quest_type')
+        batch_op.drop_column('reward')
+        batch_op.drop_column('assigned_to')
@@ -0,0 +1,27 @@
+"""Add insert sentinel to Quest table
+
+Revision ID: afedc2e36466
+Revises: 7c4e2a9d1b36
+Create Date: 2026-10-18 18:21:46.115414
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'afedc2e36466'
+down_revision = '7c4e2a9d1b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        # only ever filled in and read back inside one INSERT, see Quest._sentinel
+        batch_op.add_column(sa.Column('_sentinel', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_column('_sentinel')
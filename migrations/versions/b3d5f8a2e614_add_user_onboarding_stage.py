@@ -0,0 +1,32 @@
+"""Add onboarding_stage to User table
+
+Revision ID: b3d5f8a2e614
+Revises: 5a3e91b7c2f4
+Create Date: 2026-10-18 13:52:09.415268
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d5f8a2e614'
+down_revision = '5a3e91b7c2f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('onboarding_stage', sa.String(length=10), nullable=False, server_default='done'))
+
+    # accounts that never made a pet still have onboarding ahead of them
+    op.execute(
+        "UPDATE user SET onboarding_stage = 'pet' "
+        "WHERE NOT EXISTS (SELECT 1 FROM pet WHERE pet.user_id = user.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('onboarding_stage')
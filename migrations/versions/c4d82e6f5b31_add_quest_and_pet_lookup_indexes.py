@@ -0,0 +1,39 @@
+"""Add quest and pet lookup indexes
+
+Revision ID: c4d82e6f5b31
+Revises: 9b1f3c2d7a10
+Create Date: 2026-10-18 10:31:47.502917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d82e6f5b31'
+down_revision = '9b1f3c2d7a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.create_index('ix_quest_assigned_to_status', ['assigned_to', 'status'], unique=False)
+        batch_op.create_index('ix_quest_assigned_to_due_date', ['assigned_to', 'due_date'], unique=False)
+        batch_op.create_index('ix_quest_due_date', ['due_date'], unique=False)
+
+    # keep the oldest pet for anyone who ended up with more than one, it's the one .first() returned
+    op.execute("DELETE FROM pet WHERE id NOT IN (SELECT MIN(id) FROM pet GROUP BY user_id)")
+
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.create_index('uq_pet_user_id', ['user_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.drop_index('uq_pet_user_id')
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_due_date')
+        batch_op.drop_index('ix_quest_assigned_to_due_date')
+        batch_op.drop_index('ix_quest_assigned_to_status')
@@ -0,0 +1,58 @@
+"""Store quest repeat days as a bitmask
+
+Revision ID: d61e0c9a4f27
+Revises: b3d5f8a2e614
+Create Date: 2026-10-18 16:05:41.238719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = 'd61e0c9a4f27'
+down_revision = 'b3d5f8a2e614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('repeat_mask', sa.Integer(), nullable=False, server_default='0'))
+
+    # the JSON lists hold weekday numbers, Monday is 0, and bit n of the mask is weekday n
+    connection = op.get_bind()
+    rows = []
+    for quest_id, repeat_days in connection.execute(
+            sa.text("SELECT id, repeat_days FROM quest WHERE repeat_days IS NOT NULL")):
+        days = json.loads(repeat_days) if isinstance(repeat_days, str) else repeat_days
+        mask = 0
+        for day in days or []:
+            if isinstance(day, int) and 0 <= day < 7:
+                mask |= 1 << day
+        if mask:
+            rows.append({'id': quest_id, 'mask': mask})
+    if rows:
+        connection.execute(sa.text("UPDATE quest SET repeat_mask = :mask WHERE id = :id"), rows)
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_due_date')
+        batch_op.create_index('ix_quest_due_date_repeat_mask', ['due_date', 'repeat_mask'], unique=False)
+        batch_op.drop_column('repeat_days')
+
+
+def downgrade():
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('repeat_days', sa.JSON(), nullable=True))
+
+    connection = op.get_bind()
+    rows = [{'id': quest_id, 'days': json.dumps([day for day in range(7) if mask & (1 << day)])}
+            for quest_id, mask in connection.execute(sa.text("SELECT id, repeat_mask FROM quest"))]
+    if rows:
+        connection.execute(sa.text("UPDATE quest SET repeat_days = :days WHERE id = :id"), rows)
+
+    with op.batch_alter_table('quest', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_due_date_repeat_mask')
+        batch_op.create_index('ix_quest_due_date', ['due_date'], unique=False)
+        batch_op.drop_column('repeat_mask')
@@ -0,0 +1,32 @@
+"""Add streak_score to User table
+
+Revision ID: e7a9d41c0b58
+Revises: c4d82e6f5b31
+Create Date: 2026-10-18 11:05:22.817364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a9d41c0b58'
+down_revision = 'c4d82e6f5b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('streak_score', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        "UPDATE user SET streak_score = ("
+        "SELECT COALESCE(SUM(quest.reward * COALESCE(quest.streak, 0)), 0) "
+        "FROM quest WHERE quest.assigned_to = user.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('streak_score')
@@ -0,0 +1,61 @@
+"""Add quest completion log and daily rollup
+
+Revision ID: f2c7b5e18d93
+Revises: d61e0c9a4f27
+Create Date: 2026-10-18 17:24:12.806451
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7b5e18d93'
+down_revision = 'd61e0c9a4f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('quest_completion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quest_id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('quest_type', sa.String(length=10), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quest_completion', schema=None) as batch_op:
+        batch_op.create_index('ix_quest_completion_user_id_completed_at', ['user_id', 'completed_at', 'id'], unique=False)
+
+    op.create_table('daily_completion',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('completions', sa.Integer(), nullable=False),
+    sa.Column('special_completions', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # the latest completion of each quest is all the history there was before this
+    op.execute(
+        "INSERT INTO quest_completion (user_id, quest_id, description, quest_type, completed_at) "
+        "SELECT assigned_to, id, description, quest_type, end_time FROM quest "
+        "WHERE status = 'completed' AND end_time IS NOT NULL AND assigned_to IS NOT NULL "
+        "ORDER BY end_time, id"
+    )
+    op.execute(
+        "INSERT INTO daily_completion (user_id, day, completions, special_completions) "
+        "SELECT user_id, date(completed_at), COUNT(*), SUM(quest_type IN ('weekly', 'specific')) "
+        "FROM quest_completion GROUP BY user_id, date(completed_at)"
+    )
+
+
+def downgrade():
+    op.drop_table('daily_completion')
+    with op.batch_alter_table('quest_completion', schema=None) as batch_op:
+        batch_op.drop_index('ix_quest_completion_user_id_completed_at')
+
+    op.drop_table('quest_completion')
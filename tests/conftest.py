@@ -0,0 +1,95 @@
+""" Shared fixtures: the app on a throwaway database, and worker processes.
+
+    The app module reads its settings from the environment when it's first
+    imported, so they're set here before any test imports it. Every test in a
+    run shares the one database.
+
+    app_workers is for the multi-process tests: real app servers in their own
+    processes, on a database of their own, like gunicorn workers sharing one
+    SQLite file. Each binds a free port and reports it back, so tests can run
+    side by side.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path.insert(0, APP_DIR)
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ['PASSWORD_HASH_COST'] = '1000'
+
+from models import db  # noqa: E402, needs APP_DIR on the path
+from sqlalchemy import create_engine  # noqa: E402
+
+WORKER_START_TIMEOUT = 30
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app, interaction_buffer
+    from models import db
+    from loadquests import load_presets
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        load_presets()
+
+    yield app
+
+    interaction_buffer.stop()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _serve(environ, ports):
+    os.environ.update(environ)
+    from app import app
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+class AppWorkers:
+
+    def __init__(self, path):
+        self.environ = {'DATABASE_URL': f'sqlite:///{path}', 'PASSWORD_HASH_COST': '1000'}
+        # only the workers load the app, this process already has one on the shared test database
+        self.engine = create_engine(self.environ['DATABASE_URL'])
+        db.metadata.create_all(self.engine)
+        self.processes = []
+
+    def start(self, count, **environ):
+        """ Starts count worker processes, with any extra environment given, and returns their ports. """
+        context = multiprocessing.get_context('spawn')
+        ports = context.Queue()
+        for _ in range(count):
+            process = context.Process(target=_serve, args=({**self.environ, **environ}, ports), daemon=True)
+            process.start()
+            self.processes.append(process)
+        return [ports.get(timeout=WORKER_START_TIMEOUT) for _ in range(count)]
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        self.engine.dispose()
+
+
+@pytest.fixture
+def app_workers(tmp_path):
+    workers = AppWorkers(tmp_path / 'workers.db')
+    yield workers
+    workers.stop()
@@ -0,0 +1,33 @@
+from flask import Flask
+import pytest
+
+from metrics import RequestMetrics
+
+TOKEN = 'metrics-test-token'
+
+
+def metrics_app(**config):
+    app = Flask(__name__)
+    # no profiling, so no engine to hook into
+    app.config.update(METRICS_SAMPLE_RATE=0, **config)
+    RequestMetrics(app)
+    return app
+
+
+def test_metrics_endpoint_is_off_by_default():
+    assert metrics_app().test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_endpoint_needs_a_token_to_be_turned_on():
+    with pytest.raises(ValueError):
+        metrics_app(METRICS_ENDPOINT=True)
+
+
+def test_metrics_endpoint_wants_the_bearer_token():
+    client = metrics_app(METRICS_ENDPOINT=True, METRICS_TOKEN=TOKEN).test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': f'Bearer {TOKEN}'})
+    assert response.status_code == 200
+    assert 'kinetiquest_requests_total' in response.get_data(as_text=True)
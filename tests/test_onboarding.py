@@ -0,0 +1,79 @@
+""" Multi-process test that onboarding state stays per user.
+
+    Several app workers share one database while a batch of users register
+    concurrently, each request going to a different worker than the last.
+    Half the users finish onboarding while the other half are mid-way, then
+    everyone logs in again through yet another worker: the finished users must
+    land on /home and the rest must be sent back to where they left off.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlparse
+import urllib.request
+import threading
+
+WORKERS = 3
+USERS = 12
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def request(self, worker, path, data=None):
+        """ Returns the path a request redirected to, or the status code if it didn't. """
+        url = f"http://127.0.0.1:{self.ports[worker % len(self.ports)]}{path}"
+        body = urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(url, body) as response:
+                return response.status
+        except HTTPError as error:
+            if error.code in (301, 302, 303):
+                return urlparse(error.headers['Location']).path
+            return error.code
+
+
+def walk_user(i, client, finished, halfway):
+    """ Takes one user through onboarding and returns the steps that went somewhere unexpected. """
+    form = {'username': f'user{i}', 'password': f'password{i}', 'email': f'user{i}@example.com'}
+    problems = []
+
+    def expect(step, got, wanted):
+        if got != wanted:
+            problems.append(f"user{i} {step}: got {got}, expected {wanted}")
+
+    expect('register', client.request(i, '/register', form), '/login')
+    expect('first login', client.request(i + 1, '/login', form), '/create')
+
+    # everyone is registered before anyone moves on, so the steps really do interleave
+    halfway.wait()
+    if i in finished:
+        expect('create pet', client.request(i + 2, '/create', {'petName': f'Pet{i}', 'petSelection': 'Dog_Brown'}),
+               '/create_quests')
+        expect('pick quests', client.request(i + 3, '/create_quests', {'template_ids': '[]'}), '/home')
+    halfway.wait()
+
+    expect('second login', client.request(i + 4, '/login', form), '/home' if i in finished else '/create')
+    if i not in finished:
+        expect('quests before pet', client.request(i + 5, '/create_quests'), '/home')
+    return problems
+
+
+def test_onboarding_state_stays_per_user_across_workers(app_workers):
+    ports = app_workers.start(WORKERS)
+
+    finished = set(range(0, USERS, 2))
+    halfway = threading.Barrier(USERS)
+    with ThreadPoolExecutor(USERS) as pool:
+        results = pool.map(lambda i: walk_user(i, Client(ports), finished, halfway), range(USERS))
+        problems = [problem for user_problems in results for problem in user_problems]
+
+    assert problems == []
@@ -0,0 +1,119 @@
+""" Concurrency stress test for the pet food counters, through the real routes.
+
+    Several app workers share one database and many threads, all logged in
+    as the same user, complete quests (+1 food through /api/complete_task) and
+    feed the pet (/api/feed_pet, buffered by each worker's InteractionBuffer)
+    with every request going to a different worker than the last. Each worker
+    decides whether there's food to feed with from its own, possibly out of
+    date, view of the pet, so feeds race with each other and with completions
+    just like they do in production.
+
+    Once the buffers have flushed, every feed a worker wrote must have used up
+    a food that was really there: the final count has to be exactly the start
+    plus what completions earned minus the feeds written (from each worker's
+    /metrics), and never below 0.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+import urllib.request
+import json
+import random
+import re
+import time
+
+from models import Pet
+from sqlalchemy import select
+
+WORKERS = 3
+THREADS = 6
+OPERATIONS = 30
+ACCOUNT = {'username': 'stress_user', 'password': 'stress-password', 'email': 'stress_user@example.com'}
+# long enough for every worker's buffer to have flushed, see InteractionBuffer.flush_interval
+FLUSH_WAIT = 5
+METRICS_TOKEN = 'stress-metrics-token'
+
+
+class Client:
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, worker, path, data=None, json_body=None, headers=None):
+        """ Returns (status, body text) of a request to one of the workers. """
+        url = f"http://127.0.0.1:{self.ports[worker % len(self.ports)]}{path}"
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body, headers['Content-Type'] = json.dumps(json_body).encode(), 'application/json'
+        elif data is not None:
+            body = urlencode(data).encode()
+        try:
+            with self.opener.open(urllib.request.Request(url, body, headers)) as response:
+                return response.status, response.read().decode()
+        except HTTPError as error:
+            return error.code, error.read().decode()
+
+
+def add_quests(client, count):
+    """ Adds count daily quests through /api/batch and returns their ids. """
+    ids = []
+    while len(ids) < count:
+        size = min(100, count - len(ids))
+        operation = {'op': 'add', 'task_description': 'Stretch', 'task_type': 'daily', 'timezone': 'UTC'}
+        status, body = client.request(0, '/api/batch', json_body={'operations': [operation] * size})
+        assert status == 200, body
+        ids += [result['task_id'] for result in json.loads(body)['results']]
+    return ids
+
+
+def feed_totals(client, workers):
+    """ Feeds written and rejected, summed over every worker's /metrics. """
+    totals = {'written': 0, 'rejected': 0}
+    for worker in range(workers):
+        _, body = client.request(worker, '/metrics', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+        for name in totals:
+            totals[name] += int(re.search(rf'^kinetiquest_pet_feeds_{name}_total (\d+)$', body, re.M).group(1))
+    return totals
+
+
+def test_concurrent_feeds_never_spend_food_that_isnt_there(app_workers):
+    ports = app_workers.start(WORKERS, METRICS_ENDPOINT='1', METRICS_TOKEN=METRICS_TOKEN)
+
+    setup = Client(ports)
+    setup.request(0, '/register', ACCOUNT)
+    setup.request(0, '/login', ACCOUNT)
+    setup.request(0, '/create', {'petName': 'Stress', 'petSelection': 'Dog_Brown'})
+    setup.request(0, '/create_quests', {'template_ids': '[]'})
+    quest_ids = add_quests(setup, THREADS * OPERATIONS)
+    with app_workers.engine.connect() as connection:
+        start_food = connection.execute(select(Pet.food_quantity)).scalar()
+
+    def worker(n):
+        rng = random.Random(n)
+        client = Client(ports)
+        client.request(n, '/login', ACCOUNT)
+        completed = 0
+        for i in range(OPERATIONS):
+            target = n + i
+            # more feeds than food earned, so workers keep running out and racing for the last one
+            if rng.random() < 0.3:
+                status, _ = client.request(target, '/api/complete_task', {'task_id': quest_ids.pop()})
+                completed += status == 200
+            else:
+                client.request(target, '/api/feed_pet', {'type': 'food'})
+        return completed
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        completed = sum(pool.map(worker, range(THREADS)))
+
+    time.sleep(FLUSH_WAIT)
+    feeds = feed_totals(setup, WORKERS)
+    with app_workers.engine.connect() as connection:
+        final = connection.execute(select(Pet.food_quantity)).scalar()
+
+    assert feeds['written'] > 0
+    assert final >= 0
+    assert final == start_food + completed - feeds['written'], (start_food, completed, feeds)
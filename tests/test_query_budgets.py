@@ -0,0 +1,108 @@
+""" Exercises every route with query budgets enforced.
+
+    Runs a scripted session that touches every route in the app (a user
+    registering, onboarding, managing quests and looking after their pet),
+    with ENFORCE_QUERY_BUDGETS on so each view checks its own @query_budget.
+    Fails on any route over budget or repeating a statement, with the SQL it
+    ran, and also if a route has no budget declared or the session never
+    reaches it.
+"""
+import json
+
+import pytest
+
+from querybudget import query_budget, QueryBudgetExceeded
+
+# these never touch the database
+EXEMPT_ENDPOINTS = {'static', 'dist_asset', 'metrics'}
+
+ACCOUNT = {'username': 'budget_user', 'password': 'budget-password', 'email': 'budget_user@example.com'}
+NEW_TASK = {'task_description': 'Stretch', 'task_type': 'daily', 'timezone': 'UTC', 'repeat_days': ['Monday']}
+
+
+def steps(state):
+    """ (method, path, form data or a JSON string) for the whole session. Later steps read ids the earlier
+        ones stored in state.
+    """
+    return [
+        ('GET', '/', None),
+        ('GET', '/register', None),
+        ('POST', '/register', ACCOUNT),
+        ('GET', '/login', None),
+        ('POST', '/login', ACCOUNT),
+        ('GET', '/create', None),
+        ('POST', '/create', {'petName': 'Budget', 'petSelection': 'Dog_Brown'}),
+        ('GET', '/create_quests', None),
+        ('POST', '/create_quests', {'template_ids': '[1, 2, 3]'}),
+        ('GET', '/home', None),
+        ('GET', '/api/home_state', None),
+        ('GET', '/api/events', None),
+        ('GET', '/user_quests/', None),
+        ('POST', '/api/add_task', NEW_TASK),
+        ('POST', '/api/update_task', lambda: {'task_id': state['task_id'], 'new_description': 'Stretch more'}),
+        ('POST', '/api/complete_task', lambda: {'task_id': state['task_id']}),
+        ('POST', '/api/batch', json.dumps({'operations': [{'op': 'add', **NEW_TASK}, {'op': 'add', **NEW_TASK}]})),
+        ('POST', '/api/batch', lambda: json.dumps({'operations': [
+            {'op': 'update', 'task_id': state['batch_ids'][0], 'new_description': 'Stretch twice'},
+            {'op': 'complete', 'task_id': state['batch_ids'][0]},
+            {'op': 'complete', 'task_id': state['batch_ids'][1]},
+            {'op': 'delete', 'task_id': state['batch_ids'][1]},
+        ]})),
+        ('GET', '/api/completed_tasks', None),
+        ('GET', '/api/completed_tasks?format=ndjson', None),
+        ('GET', '/api/completion_stats', None),
+        ('POST', '/api/feed_pet', {'type': 'food'}),
+        ('POST', '/api/play_with_pet', None),
+        ('GET', '/api/get_food_quantities', None),
+        ('POST', '/api/update_food_quantities', {'food_quantity': 3, 'special_food_quantity': 2}),
+        ('POST', '/api/delete_task', lambda: {'task_id': state['task_id']}),
+        ('GET', '/logout', None),
+        # and once more as a returning user with quests and a pet
+        ('POST', '/login', ACCOUNT),
+        ('GET', '/api/home_state', None),
+    ]
+
+
+@pytest.fixture
+def enforced(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'ENFORCE_QUERY_BUDGETS', True)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', True)
+    return app
+
+
+def test_every_route_declares_a_query_budget(app):
+    missing = sorted(rule.rule for rule in app.url_map.iter_rules()
+                     if rule.endpoint not in EXEMPT_ENDPOINTS
+                     and not hasattr(app.view_functions[rule.endpoint], 'query_budget'))
+    assert missing == [], "no @query_budget on these routes"
+
+
+def test_every_route_is_within_its_query_budget(enforced):
+    state = {}
+    visited = set()
+    failures = []
+    client = enforced.test_client()
+
+    for method, path, data in steps(state):
+        data = data() if callable(data) else data
+        endpoint = enforced.url_map.bind('localhost').match(path.split('?')[0], method=method)[0]
+        visited.add(endpoint)
+
+        try:
+            with query_budget(10 ** 6):
+                response = client.open(path, method=method, data=data,
+                                       content_type='application/json' if isinstance(data, str) else None)
+        except QueryBudgetExceeded as error:
+            failures.append(f"{method} {path}: {error}")
+            continue
+
+        if path == '/api/add_task':
+            state['task_id'] = response.get_json()['task_id']
+        if path == '/api/batch' and 'batch_ids' not in state:
+            state['batch_ids'] = [result['task_id'] for result in response.get_json()['results']]
+        response.close()  # the event stream would otherwise stay subscribed
+
+    unvisited = sorted(endpoint for endpoint in enforced.view_functions
+                       if endpoint not in visited and endpoint not in EXEMPT_ENDPOINTS)
+    assert unvisited == [], "the session never reaches these endpoints"
+    assert failures == []
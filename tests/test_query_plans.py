@@ -0,0 +1,51 @@
+""" EXPLAIN QUERY PLAN test for the hot quest and pet lookups.
+
+    Runs the same statements the app issues against the real schema and fails
+    if SQLite would answer any of them with a full table scan, so a dropped or
+    renamed index gets caught before it ships.
+"""
+from datetime import datetime, timedelta
+import re
+
+import pytest
+import pytz
+from sqlalchemy import select, func, text
+
+from models import db, Quest, Pet
+from history import completed_quests_query, daily_completions_query
+from rollover import rollover_due
+
+# "SCAN quest" is a full table scan, "SCAN quest USING INDEX ..." is fine
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(quest|pet|quest_completion|daily_completion)\b(?!.*\bUSING\b)')
+
+
+def hot_queries():
+    now = datetime.now(tz=pytz.utc)
+
+    return {
+        'quests for user': select(Quest).where(Quest.assigned_to == 1),
+        'completed quests for user': select(Quest).where(Quest.assigned_to == 1, Quest.status == 'completed'),
+        'completed quests page': completed_quests_query(1, since=now, cursor=(now, 10)).limit(51),
+        'overdue quests for user': select(Quest.id).where(Quest.assigned_to.in_([1, 2]), rollover_due(now)),
+        'overdue users': select(Quest.assigned_to).where(rollover_due(now)).distinct(),
+        'next due date per user': (
+            select(Quest.assigned_to, func.min(Quest.due_date))
+            .where(Quest.due_date >= now)
+            .group_by(Quest.assigned_to)
+        ),
+        'completion stats for user': daily_completions_query(1, now.date() - timedelta(days=30), now.date()),
+        'pet for user': select(Pet).where(Pet.user_id == 1),
+    }
+
+
+def explain(statement):
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize('name', sorted(hot_queries()))
+def test_hot_query_uses_an_index(app, name):
+    with app.app_context():
+        plan = explain(hot_queries()[name])
+    assert not any(FULL_SCAN.match(line) for line in plan), plan